@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+CACHE_VERSION = 1
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Считает SHA-256 содержимого файла, читая его блоками."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkCache:
+    """
+    Версионированный кэш нарезанных фрагментов документов на диске.
+
+    Для каждого файла хранятся его размер, mtime, SHA-256 и готовые фрагменты.
+    Файл считается неизменным, если совпадают размер и mtime; при их расхождении
+    сверяется хэш содержимого, и только изменившийся файл нужно разбирать заново.
+    Настройки нарезки входят в ключ всего кэша: при их смене кэш сбрасывается.
+    """
+
+    def __init__(self, cache_path: str, settings: Dict[str, Any]):
+        self.cache_path = cache_path
+        self.settings = dict(settings)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[!] Кэш фрагментов повреждён и будет пересоздан: {e}")
+            return
+
+        if data.get("version") != CACHE_VERSION or data.get("settings") != self.settings:
+            return
+        self.entries = data.get("files", {})
+
+    def get(self, key: str, path: str) -> Optional[List[str]]:
+        """Возвращает фрагменты файла из кэша или None, если файл изменился."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        stat = os.stat(path)
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["chunks"]
+
+        # mtime мог поменяться без изменения содержимого (копирование, checkout)
+        if entry["size"] == stat.st_size and entry["sha256"] == file_sha256(path):
+            entry["mtime"] = stat.st_mtime
+            self._dirty = True
+            return entry["chunks"]
+
+        return None
+
+    def put(self, key: str, path: str, chunks: List[str]) -> None:
+        stat = os.stat(path)
+        self.entries[key] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": file_sha256(path),
+            "chunks": chunks,
+        }
+        self._dirty = True
+
+    def retain(self, keys: List[str]) -> None:
+        """Удаляет из кэша записи о файлах, которых больше нет в корпусе."""
+        stale = set(self.entries) - set(keys)
+        for key in stale:
+            del self.entries[key]
+        if stale:
+            self._dirty = True
+
+    def fingerprint(self) -> str:
+        """Хэш настроек нарезки и содержимого всех файлов корпуса."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self.settings, sort_keys=True).encode("utf-8"))
+        for key in sorted(self.entries):
+            digest.update(f"{key}\0{self.entries[key]['sha256']}\0".encode("utf-8"))
+        return digest.hexdigest()
+
+    def save(self) -> None:
+        """Атомарно записывает кэш на диск, если он менялся."""
+        if not self._dirty:
+            return
+
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": CACHE_VERSION,
+                "settings": self.settings,
+                "files": self.entries,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
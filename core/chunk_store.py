@@ -0,0 +1,143 @@
+import json
+import mmap
+import os
+from array import array
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+STORE_VERSION = 1
+OFFSET_TYPECODE = "q"
+LENGTH_TYPECODE = "l"
+SOURCE_TYPECODE = "l"
+
+
+class ChunkStore:
+    """
+    Компактное хранилище фрагментов корпуса.
+
+    Тексты всех фрагментов лежат в одном UTF-8 буфере (на диске — в файле,
+    отображённом в память через mmap), а смещения, длины и номера источников —
+    в колонках array. Фрагмент адресуется целым chunk_id, поэтому получение
+    текста и источника по номеру выполняется за O(1).
+    """
+
+    def __init__(self, buffer, offsets: array, lengths: array, source_ids: array,
+                 sources: List[str], fingerprint: str = ""):
+        self._buffer = buffer
+        self.offsets = offsets
+        self.lengths = lengths
+        self.source_ids = source_ids
+        self.sources = sources
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Tuple[str, str]], fingerprint: str = "") -> "ChunkStore":
+        """Собирает хранилище в памяти из пар (текст, источник)."""
+        buffer = bytearray()
+        offsets, lengths, source_ids = array(OFFSET_TYPECODE), array(LENGTH_TYPECODE), array(SOURCE_TYPECODE)
+        sources: List[str] = []
+        source_index = {}
+
+        for text, source in chunks:
+            data = text.encode("utf-8")
+            if source not in source_index:
+                source_index[source] = len(sources)
+                sources.append(source)
+            offsets.append(len(buffer))
+            lengths.append(len(data))
+            source_ids.append(source_index[source])
+            buffer.extend(data)
+
+        return cls(bytes(buffer), offsets, lengths, source_ids, sources, fingerprint)
+
+    @staticmethod
+    def _paths(base_path: str) -> Tuple[str, str, str]:
+        return f"{base_path}.txt", f"{base_path}.idx", f"{base_path}.meta.json"
+
+    def save(self, base_path: str) -> None:
+        """Записывает буфер, колонки и метаданные; метаданные пишутся последними."""
+        directory = os.path.dirname(base_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        text_path, idx_path, meta_path = self._paths(base_path)
+        with open(f"{text_path}.tmp", "wb") as f:
+            f.write(self._buffer)
+        with open(f"{idx_path}.tmp", "wb") as f:
+            self.offsets.tofile(f)
+            self.lengths.tofile(f)
+            self.source_ids.tofile(f)
+        with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "version": STORE_VERSION,
+                "fingerprint": self.fingerprint,
+                "count": len(self),
+                "itemsizes": [self.offsets.itemsize, self.lengths.itemsize, self.source_ids.itemsize],
+                "sources": self.sources,
+            }, f, ensure_ascii=False)
+
+        os.replace(f"{text_path}.tmp", text_path)
+        os.replace(f"{idx_path}.tmp", idx_path)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    @classmethod
+    def open(cls, base_path: str, fingerprint: Optional[str] = None) -> Optional["ChunkStore"]:
+        """
+        Открывает сохранённое хранилище с отображением текста в память.
+
+        Returns:
+            None, если хранилища нет, оно другой версии или его fingerprint
+            не совпадает с ожидаемым.
+        """
+        text_path, idx_path, meta_path = cls._paths(base_path)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        offsets, lengths, source_ids = array(OFFSET_TYPECODE), array(LENGTH_TYPECODE), array(SOURCE_TYPECODE)
+        if meta.get("version") != STORE_VERSION:
+            return None
+        if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+            return None
+        if meta.get("itemsizes") != [offsets.itemsize, lengths.itemsize, source_ids.itemsize]:
+            return None
+
+        count = meta["count"]
+        try:
+            with open(idx_path, "rb") as f:
+                offsets.fromfile(f, count)
+                lengths.fromfile(f, count)
+                source_ids.fromfile(f, count)
+            with open(text_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    buffer = b""
+        except (OSError, EOFError):
+            return None
+
+        return cls(buffer, offsets, lengths, source_ids, meta["sources"], meta.get("fingerprint", ""))
+
+    def close(self) -> None:
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        """Размер текстового буфера в байтах."""
+        return len(self._buffer)
+
+    def text(self, chunk_id: int) -> str:
+        start = self.offsets[chunk_id]
+        return self._buffer[start:start + self.lengths[chunk_id]].decode("utf-8")
+
+    def source(self, chunk_id: int) -> str:
+        return self.sources[self.source_ids[chunk_id]]
+
+    def texts(self) -> Iterator[str]:
+        for chunk_id in range(len(self)):
+            yield self.text(chunk_id)
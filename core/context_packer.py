@@ -0,0 +1,155 @@
+import re
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, List, Optional
+
+from core.tokenizer import count_tokens, count_tokens_many
+
+MIN_OVERLAP_CHARS = 20  # более короткие совпадения считаем случайными
+MAX_OVERLAP_CHARS = 200  # перекрытие сплиттера (100 символов) с запасом на пробелы
+MIN_FRAGMENT_TOKENS = 30  # остаток бюджета меньше этого не заполняем обрезками
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+(?=[«\"(\dA-ZА-ЯЁ])")
+
+
+@dataclass
+class Fragment:
+    text: str
+    score: float = 1.0
+    source: str = ""
+    ref: Optional[int] = None  # идентификатор фрагмента у вызывающего (например, id в ChunkStore)
+
+
+@dataclass
+class PackedContext:
+    fragments: List[Fragment] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    candidates: int = 0
+    duplicates: int = 0
+    trimmed: int = 0
+
+    def render(self, template: str = "[{source}]:\n{text}", separator: str = "\n\n") -> str:
+        return separator.join(template.format(source=f.source, text=f.text) for f in self.fragments)
+
+    def refs(self) -> List[Optional[int]]:
+        return [f.ref for f in self.fragments]
+
+    def summary(self) -> str:
+        return (f"{len(self.fragments)} из {self.candidates} фрагментов, {self.tokens}/{self.budget} токенов, "
+                f"дубликатов {self.duplicates}, обрезано {self.trimmed}")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _overlap(left: str, right: str) -> int:
+    """Длина самого длинного суффикса left, совпадающего с префиксом right."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _strip_repeats(fragment: Fragment, text: str, chosen: Iterable[Fragment]) -> str:
+    """
+    Убирает из текста фрагмента то, что уже есть в выбранных фрагментах.
+
+    Сравниваются только чанки одного источника с известными ref: фрагмент, целиком
+    содержащийся в выбранном, отбрасывается (возвращается ""), а перекрытие сплиттера
+    (CHUNK_OVERLAP символов) вырезается только у соседних чанков (ref ± 1).
+    Фрагменты без ref (например, абзацы договора) не сокращаются.
+    """
+    if fragment.ref is None:
+        return text
+    for other in chosen:
+        if not text:
+            break
+        if other.ref is None or other.source != fragment.source:
+            continue
+        if len(text) >= MIN_OVERLAP_CHARS and text in other.text:
+            return ""
+        if other.ref == fragment.ref - 1:
+            head = _overlap(other.text, text)
+            if head:
+                text = text[head:].lstrip()
+        elif other.ref == fragment.ref + 1:
+            tail = _overlap(text, other.text)
+            if tail:
+                text = text[:-tail].rstrip()
+    return text
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_END_RE.split(text) if sentence]
+
+
+def trim_to_budget(text: str, max_tokens: int) -> str:
+    """Обрезает текст по границе предложения так, чтобы он занимал не больше max_tokens."""
+    if max_tokens <= 0:
+        return ""
+    sentences = split_sentences(text)
+    kept, used = [], 0
+    for sentence, tokens in zip(sentences, count_tokens_many(sentences)):
+        if used + tokens > max_tokens:
+            break
+        kept.append(sentence)
+        used += tokens
+    if kept:
+        return " ".join(kept)
+
+    # Первое предложение длиннее бюджета — режем по словам пропорционально числу токенов
+    total = count_tokens(text)
+    cut = text[:len(text) * max_tokens // max(total, 1)]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+def pack_context(fragments: Iterable[Fragment], max_tokens: int, strategy: str = "density") -> PackedContext:
+    """
+    Упаковывает ранжированные фрагменты в бюджет max_tokens.
+
+    Фрагменты передаются по убыванию релевантности. Стратегия "density" жадно берёт
+    фрагменты с наибольшей релевантностью на токен, "rank" — подряд в исходном порядке
+    (например, начало документа). Повторы убираются относительно уже выбранных
+    фрагментов, поэтому текст не теряется из-за фрагмента, не попавшего в контекст.
+    Фрагмент, не поместившийся целиком, обрезается по границе предложения. В результате
+    фрагменты идут в исходном порядке, а tokens — их суммарная длина в токенах.
+    """
+    if strategy not in ("density", "rank"):
+        raise ValueError("Invalid strategy: choose 'density' or 'rank'")
+
+    fragments = [replace(f, text=_normalize(f.text)) for f in fragments]
+    fragments = [f for f in fragments if f.text]
+    packed = PackedContext(budget=max_tokens, candidates=len(fragments))
+
+    costs = count_tokens_many([f.text for f in fragments])
+    order = list(range(len(fragments)))
+    if strategy == "density":
+        order.sort(key=lambda i: max(fragments[i].score, 0.0) / max(costs[i], 1), reverse=True)
+
+    chosen: Dict[int, Fragment] = {}
+    for i in order:
+        fragment, cost = fragments[i], costs[i]
+        text = _strip_repeats(fragment, fragment.text, chosen.values())
+        if not text:
+            packed.duplicates += 1
+            continue
+        if text != fragment.text:
+            fragment, cost = replace(fragment, text=text), count_tokens(text)
+
+        remaining = max_tokens - packed.tokens
+        if cost <= remaining:
+            chosen[i] = fragment
+            packed.tokens += cost
+            continue
+        if remaining >= MIN_FRAGMENT_TOKENS:
+            text = trim_to_budget(fragment.text, remaining)
+            if text:
+                chosen[i] = replace(fragment, text=text)
+                packed.tokens += count_tokens(text)
+                packed.trimmed += 1
+        if strategy == "rank":
+            break
+
+    packed.fragments = [chosen[i] for i in sorted(chosen)]
+    return packed
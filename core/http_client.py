@@ -0,0 +1,147 @@
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class HttpMetrics:
+    """Счётчики запросов, статусов и задержек по хостам."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
+            "requests": 0, "errors": 0, "retries": 0, "statuses": defaultdict(int), "total_latency": 0.0,
+        })
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, host: str, status: Optional[int], latency: float, retried: bool = False) -> None:
+        with self._lock:
+            stats = self._stats[host]
+            stats["requests"] += 1
+            stats["total_latency"] += latency
+            stats["retries"] += int(retried)
+            if status is None or status >= 500:
+                stats["errors"] += 1
+            stats["statuses"][status if status is not None else "error"] += 1
+            self._latencies[host].append(latency)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Сводка по хостам: число запросов, ошибки, статусы, средняя задержка и p95."""
+        with self._lock:
+            result = {}
+            for host, stats in self._stats.items():
+                latencies = sorted(self._latencies[host])
+                result[host] = {
+                    "requests": stats["requests"],
+                    "errors": stats["errors"],
+                    "retries": stats["retries"],
+                    "statuses": dict(stats["statuses"]),
+                    "avg_latency": stats["total_latency"] / stats["requests"],
+                    "p95_latency": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                }
+            return result
+
+
+class HttpClient:
+    """
+    Общий HTTP-клиент для сетевых инструментов.
+
+    Переиспользует соединения через пул requests.Session, ограничивает число
+    одновременных запросов к одному хосту, задаёт таймауты на соединение и чтение
+    и повторяет запросы при сетевых ошибках и статусах 429/5xx с экспоненциальной
+    задержкой и джиттером. Каждая попытка записывается в metrics.
+    """
+
+    def __init__(self, connect_timeout: float = 3.05, read_timeout: float = 15.0, retries: int = 2,
+                 backoff: float = 0.5, max_backoff: float = 8.0, pool_connections: int = 10,
+                 pool_maxsize: int = 10, per_host_limit: int = 8):
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.per_host_limit = per_host_limit
+        self.metrics = HttpMetrics()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._limits_lock = threading.Lock()
+
+    def _host_limit(self, host: str) -> threading.BoundedSemaphore:
+        with self._limits_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_limits[host]
+
+    def _delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        # full jitter: равномерно от 0 до экспоненциально растущей границы
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def request(self, method: str, url: str, timeout: Optional[Tuple[float, float]] = None,
+                **kwargs) -> requests.Response:
+        """Выполняет запрос с таймаутами, лимитом на хост и повторами."""
+        host = urlsplit(url).netloc
+        limit = self._host_limit(host)
+
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                with limit:
+                    response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.metrics.record(host, None, time.perf_counter() - start, retried=attempt > 0)
+                if attempt == self.retries:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+
+            self.metrics.record(host, response.status_code, time.perf_counter() - start, retried=attempt > 0)
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                time.sleep(self._delay(attempt, response))
+                continue
+            return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def get_json(self, url: str, **kwargs) -> Any:
+        response = self.get(url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def arequest(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Асинхронный вариант request: запрос выполняется в пуле потоков и не блокирует event loop."""
+        return await asyncio.to_thread(self.request, method, url, **kwargs)
+
+    async def aget_json(self, url: str, **kwargs) -> Any:
+        return await asyncio.to_thread(self.get_json, url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_default_client: Optional[HttpClient] = None
+_default_lock = threading.Lock()
+
+
+def get_default_client() -> HttpClient:
+    """Возвращает общий для процесса HTTP-клиент, создавая его при первом обращении."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
@@ -0,0 +1,241 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from core.context_packer import trim_to_budget
+from core.tokenizer import count_tokens
+
+# pdfplumber и python-docx импортируются при первом чтении файла, а не при импорте модуля
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+PAGES_PER_TASK = 8
+DEFAULT_WORKERS = int(os.environ.get("INGEST_WORKERS", "0")) or os.cpu_count() or 1
+
+# Пулы создаются и из фоновых потоков (прогрев индекса), пока живы другие потоки
+# (запись логов, HTTP-пулы): fork такого процесса может зависнуть на чужой блокировке
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+@dataclass
+class IngestionResult:
+    """Результат извлечения текста из одного файла."""
+    path: str
+    pages: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.pages)
+
+
+def is_supported(path: str) -> bool:
+    return path.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def pdf_page_count(path: str) -> int:
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    """Извлекает текст страниц [start, stop) PDF-файла; выполняется в воркере."""
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages[start:stop]]
+
+
+def extract_docx(path: str) -> List[str]:
+    from docx import Document as DocxDocument
+    doc = DocxDocument(path)
+    return ["\n".join(p.text for p in doc.paragraphs)]
+
+
+def read_txt(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [f.read()]
+
+
+def _timed(func: Callable[..., List[str]], *args) -> Tuple[List[str], float]:
+    start = time.perf_counter()
+    pages = func(*args)
+    return pages, time.perf_counter() - start
+
+
+def _plan(path: str, pages_per_task: int) -> List[Tuple[Callable[..., List[str]], tuple]]:
+    """Разбивает файл на независимые задачи извлечения."""
+    ext = path.lower()
+    if ext.endswith(".pdf"):
+        count = pdf_page_count(path)
+        return [(extract_pdf_pages, (path, start, min(start + pages_per_task, count)))
+                for start in range(0, count, pages_per_task)]
+    if ext.endswith(".docx"):
+        return [(extract_docx, (path,))]
+    if ext.endswith(".txt"):
+        return [(read_txt, (path,))]
+    raise ValueError(f"Неподдерживаемый формат файла: {os.path.basename(path)}")
+
+
+def process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Пул процессов извлечения текста, запускаемых без fork текущего процесса."""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=_MP_CONTEXT)
+
+
+def ingest_files(paths: Sequence[str], max_workers: Optional[int] = None,
+                 pages_per_task: int = PAGES_PER_TASK) -> List[IngestionResult]:
+    """
+    Извлекает текст из набора файлов, распределяя страницы PDF и файлы DOCX по пулу процессов.
+
+    Args:
+        paths: Пути к файлам .pdf/.docx/.txt.
+        max_workers: Размер пула процессов. 1 — извлечение в текущем процессе.
+            По умолчанию берётся INGEST_WORKERS или число ядер.
+        pages_per_task: Сколько страниц PDF обрабатывает одна задача пула.
+
+    Returns:
+        List[IngestionResult]: Результаты в порядке paths, страницы — в исходном порядке.
+        Ошибка в одном файле не прерывает загрузку остальных, а записывается в его результат.
+    """
+    results = [IngestionResult(path=path) for path in paths]
+    parts: Dict[int, Dict[int, List[str]]] = {}
+    tasks = []
+
+    for file_idx, path in enumerate(paths):
+        start = time.perf_counter()
+        try:
+            plan = _plan(path, pages_per_task)
+        except Exception as e:
+            results[file_idx].error = str(e)
+            continue
+        results[file_idx].seconds += time.perf_counter() - start
+        parts[file_idx] = {}
+        tasks.extend((file_idx, part_idx, func, args) for part_idx, (func, args) in enumerate(plan))
+
+    workers = min(max_workers or DEFAULT_WORKERS, len(tasks))
+    if workers <= 1:
+        for file_idx, part_idx, func, args in tasks:
+            if results[file_idx].error:
+                continue
+            try:
+                parts[file_idx][part_idx], seconds = _timed(func, *args)
+                results[file_idx].seconds += seconds
+            except Exception as e:
+                results[file_idx].error = str(e)
+    else:
+        with process_pool(workers) as pool:
+            futures = {pool.submit(_timed, func, *args): (file_idx, part_idx)
+                       for file_idx, part_idx, func, args in tasks}
+            for future in as_completed(futures):
+                file_idx, part_idx = futures[future]
+                try:
+                    parts[file_idx][part_idx], seconds = future.result()
+                    results[file_idx].seconds += seconds
+                except Exception as e:
+                    results[file_idx].error = results[file_idx].error or str(e)
+
+    for file_idx, file_parts in parts.items():
+        if results[file_idx].error:
+            continue
+        for part_idx in sorted(file_parts):
+            results[file_idx].pages.extend(file_parts[part_idx])
+
+    return results
+
+
+def ingest_file(path: str, max_workers: Optional[int] = None,
+                pages_per_task: int = PAGES_PER_TASK) -> IngestionResult:
+    return ingest_files([path], max_workers=max_workers, pages_per_task=pages_per_task)[0]
+
+
+def iter_pages(path: str, max_workers: int = 1, pages_per_task: int = PAGES_PER_TASK) -> Iterator[str]:
+    """
+    Лениво отдаёт текст документа постранично, извлекая каждую страницу ровно один раз.
+
+    Если потребитель прекращает чтение, следующие страницы не открываются.
+    При max_workers > 1 страницы PDF извлекаются пулом процессов с опережением
+    не более чем на max_workers задач.
+    """
+    ext = path.lower()
+    if ext.endswith(".pdf"):
+        if max_workers > 1:
+            yield from _iter_pdf_pages_parallel(path, max_workers, pages_per_task)
+            return
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            for page in pdf.pages:
+                text = page.extract_text() or ""
+                close = getattr(page, "close", None)
+                if close:
+                    close()  # освобождаем разобранные объекты страницы
+                yield text
+    elif ext.endswith(".docx"):
+        yield from extract_docx(path)
+    elif ext.endswith(".txt"):
+        yield from read_txt(path)
+    else:
+        raise ValueError(f"Неподдерживаемый формат файла: {os.path.basename(path)}")
+
+
+def _iter_pdf_pages_parallel(path: str, max_workers: int, pages_per_task: int) -> Iterator[str]:
+    count = pdf_page_count(path)
+    ranges = iter(range(0, count, pages_per_task))
+    pool = process_pool(max_workers)
+    pending = deque()
+    try:
+        for start in ranges:
+            pending.append(pool.submit(extract_pdf_pages, path, start, min(start + pages_per_task, count)))
+            if len(pending) >= max_workers:
+                break
+        while pending:
+            pages = pending.popleft().result()
+            start = next(ranges, None)
+            if start is not None:
+                pending.append(pool.submit(extract_pdf_pages, path, start, min(start + pages_per_task, count)))
+            yield from pages
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_text_budgeted(path: str, max_chars: Optional[int] = None, max_tokens: Optional[int] = None,
+                          max_workers: int = 1) -> str:
+    """
+    Собирает текст документа, пока не исчерпан бюджет символов или токенов.
+
+    Пустые страницы пропускаются. Страница, не помещающаяся в бюджет, обрезается
+    (по токенам — по границе предложения), поэтому бюджет соблюдается и для TXT/DOCX,
+    которые читаются одной «страницей». Страницы после исчерпания бюджета
+    не извлекаются, поэтому время и память зависят от бюджета, а не от размера документа.
+    """
+    pages: List[str] = []
+    chars = tokens = 0
+    for text in iter_pages(path, max_workers=max_workers):
+        if not text:
+            continue
+        last = False
+        if max_chars is not None and chars + len(text) >= max_chars:
+            text = text[:max_chars - chars]
+            last = True
+        if max_tokens is not None:
+            page_tokens = count_tokens(text)
+            if tokens + page_tokens > max_tokens:
+                # Грубо отрезаем заведомо лишнее (токен короче 8 символов), затем режем по предложениям
+                text = trim_to_budget(text[:(max_tokens - tokens) * 8], max_tokens - tokens)
+                page_tokens = count_tokens(text)
+                last = True
+            tokens += page_tokens
+        if text:
+            pages.append(text)
+            chars += len(text) + 1
+        if last or (max_tokens is not None and tokens >= max_tokens):
+            break
+    return "\n".join(pages)
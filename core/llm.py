@@ -0,0 +1,106 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+
+def response_text(response: Any) -> str:
+    """Приводит ответ модели (строка, {'content': ...} или ChatMessage) к строке."""
+    if isinstance(response, str):
+        return response.strip()
+    if isinstance(response, dict) and "content" in response:
+        return str(response["content"]).strip()
+    content = getattr(response, "content", None)
+    if content is not None:
+        return str(content).strip()
+    raise TypeError("❌ Неверный тип ответа от модели: ожидается строка или {'content': ...}")
+
+
+def model_name(model: Any) -> str:
+    """Имя модели для ключей кэша: model_name, model_id или имя класса клиента."""
+    return str(getattr(model, "model_name", None) or getattr(model, "model_id", None) or type(model).__name__)
+
+
+def call_with_timeout(func: Callable[[str], Any], prompt: str, timeout: Optional[float],
+                      limit: Optional[threading.Semaphore] = None) -> Any:
+    """
+    Вызывает func(prompt) с ограничением по времени.
+
+    Вызов выполняется в daemon-потоке: по истечении timeout поднимается TimeoutError,
+    а зависший запрос дорабатывает в фоне и не мешает завершению процесса. Если передан
+    limit, слот семафора занимается до начала вызова и освобождается только когда вызов
+    действительно завершится, поэтому зависшие запросы тоже учитываются в лимите.
+    """
+    if limit is not None and not limit.acquire(timeout=timeout):
+        raise TimeoutError(f"Нет свободного слота для запроса к модели за {timeout} с")
+    if timeout is None:
+        try:
+            return func(prompt)
+        finally:
+            if limit is not None:
+                limit.release()
+
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = func(prompt)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            if limit is not None:
+                limit.release()
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError(f"Модель не ответила за {timeout} с")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def call_with_retries(func: Callable[[str], Any], prompt: str, timeout: Optional[float] = None,
+                      retries: int = 2, backoff: float = 1.0,
+                      limit: Optional[threading.Semaphore] = None) -> str:
+    """Вызывает модель с таймаутом и повторами с экспоненциальной задержкой и джиттером."""
+    for attempt in range(retries + 1):
+        try:
+            return response_text(call_with_timeout(func, prompt, timeout, limit))
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+
+def map_concurrent(func: Callable[[str], Any], prompts: Sequence[str], max_concurrency: int = 4,
+                   timeout: Optional[float] = None, retries: int = 2,
+                   backoff: float = 1.0, limit: Optional[threading.Semaphore] = None
+                   ) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Параллельно отправляет промпты в модель, не более max_concurrency одновременно.
+
+    Лимит считает и запросы, брошенные по таймауту, но ещё выполняющиеся в фоне.
+    Общий семафор limit позволяет ограничить запросы сразу нескольких вызовов
+    map_concurrent; без него создаётся свой на max_concurrency слотов.
+
+    Returns:
+        List[Tuple[Optional[str], Optional[str]]]: Пары (ответ, ошибка) в порядке prompts.
+        Неудачный промпт не прерывает обработку остальных.
+    """
+    if limit is None:
+        limit = threading.BoundedSemaphore(max(1, max_concurrency))
+
+    def run(prompt: str) -> Tuple[Optional[str], Optional[str]]:
+        try:
+            return call_with_retries(func, prompt, timeout=timeout, retries=retries, backoff=backoff,
+                                     limit=limit), None
+        except Exception as e:
+            return None, str(e) or type(e).__name__
+
+    if not prompts:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(prompts)))) as pool:
+        return list(pool.map(run, prompts))
@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.http_client import HttpClient, get_default_client
+
+
+class RateCache:
+    """
+    Кэш полной таблицы курсов exchangerate-api.com.
+
+    Таблица latest/{pivot} запрашивается один раз за окно ttl, а курс любой пары
+    вычисляется локально через кросс-курс. В течение stale_ttl после истечения ttl
+    отдаётся устаревшая таблица, а обновление идёт в фоне (stale-while-revalidate).
+    Вместо сети можно использовать локальный файл-фикстуру в формате ответа API.
+    """
+    LATEST_URL = "https://v6.exchangerate-api.com/v6/{api_key}/latest/{base}"
+
+    def __init__(self, api_key: Optional[str] = None, pivot: str = "USD", ttl: float = 3600.0,
+                 stale_ttl: float = 6 * 3600.0, fixture_path: Optional[str] = None,
+                 http_client: Optional[HttpClient] = None):
+        if not api_key and not fixture_path:
+            raise ValueError("Необходимо указать ключ API или путь к файлу с курсами")
+        self.api_key = api_key
+        self.pivot = pivot.upper()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.fixture_path = fixture_path
+        self.http_client = http_client or get_default_client()
+        self._rates: Optional[Dict[str, float]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._refreshing = False
+
+    def _fetch(self) -> Dict[str, float]:
+        if self.fixture_path:
+            with open(self.fixture_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        else:
+            url = self.LATEST_URL.format(api_key=self.api_key, base=self.pivot)
+            data = self.http_client.get_json(url)
+
+        if data.get("result", "success") != "success" or "conversion_rates" not in data:
+            raise ValueError(f"Не удалось получить курсы валют: {data.get('error-type', data)}")
+
+        rates = {code.upper(): float(rate) for code, rate in data["conversion_rates"].items()}
+        rates[data.get("base_code", self.pivot).upper()] = 1.0
+        return rates
+
+    def _refresh(self) -> Dict[str, float]:
+        rates = self._fetch()
+        with self._lock:
+            self._rates, self._fetched_at = rates, time.monotonic()
+        return rates
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self._refresh()
+        except Exception as e:
+            print(f"[!] Фоновое обновление курсов не удалось: {e}")
+        finally:
+            self._refreshing = False
+
+    def rates(self) -> Dict[str, float]:
+        """Возвращает таблицу курсов относительно pivot, при необходимости обновляя её."""
+        with self._lock:
+            rates, age = self._rates, time.monotonic() - self._fetched_at
+            if rates is not None and age <= self.ttl:
+                return rates
+            if rates is not None and age <= self.ttl + self.stale_ttl:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_in_background, daemon=True).start()
+                return rates
+
+        # Синхронная загрузка: параллельные вызовы ждут один запрос, а не шлют свои
+        with self._fetch_lock:
+            with self._lock:
+                if self._rates is not None and time.monotonic() - self._fetched_at <= self.ttl:
+                    return self._rates
+            return self._refresh()
+
+    def rate(self, base_currency: str, target_currency: str) -> float:
+        rates = self.rates()
+        base, target = base_currency.strip().upper(), target_currency.strip().upper()
+        for code in (base, target):
+            if code not in rates:
+                raise ValueError(f"Неизвестный код валюты: {code}")
+        return rates[target] / rates[base]
+
+    def convert(self, base_currency: str, target_currency: str, amount: float = 1.0) -> Tuple[float, float]:
+        """Возвращает (conversion_rate, conversion_result) для одной пары."""
+        conversion_rate = self.rate(base_currency, target_currency)
+        return conversion_rate, round(amount * conversion_rate, 4)
+
+    def convert_many(self, conversions: Iterable[Tuple[str, str, float]]) -> List[Tuple[float, float]]:
+        """Конвертирует набор троек (base, target, amount) по одной таблице курсов."""
+        return [self.convert(base, target, 1.0 if amount is None else amount)
+                for base, target, amount in conversions]
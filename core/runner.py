@@ -1,37 +1,63 @@
 import time
-from utils.logger import log_agent_call
+from typing import Optional
+from utils.logger import log_agent_call, log_trace
 from core.tokenizer import count_tokens
+from core.tracing import Tracer, default_tracer, messages_text
 
-def run_and_log(agent, task: str):
-    start = time.time()
-    result = agent.run(task)
-    end = time.time()
+def run_and_log(agent, task: str, tracer: Optional[Tracer] = None, reset: bool = True):
+    tracer = tracer or default_tracer
+    tracer.instrument(agent)
 
-    input_tokens = getattr(agent.model, "last_input_token_count", None)
-    output_tokens = getattr(agent.model, "last_output_token_count", None)
+    start = tracer.start()
+    result = None
+    error = ""
+    try:
+        result = agent.run(task, reset=reset)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        raise
+    finally:
+        end = time.time()
+        trace = tracer.finish(agent, task, start, end, error=error or None)
+        _log_run(agent, task, result, trace, round(end - start, 2), error)
+
+    return result
+
+
+def _log_run(agent, task: str, result, trace, duration: float, error: str):
+    input_tokens = trace.attributes.get("input_tokens")
+    output_tokens = trace.attributes.get("output_tokens")
     last_thought = ""
     prompt = ""
 
     # Попытка извлечь информацию из последнего шага
     if hasattr(agent, "memory") and agent.memory.steps:
         last_step = agent.memory.steps[-1]
-        prompt = getattr(last_step, "model_input", "") or task
+        prompt = messages_text(getattr(last_step, "model_input_messages", None)) or task
         result_text = getattr(last_step, "model_output", "") or ""
         last_thought = result_text.strip()
 
     if input_tokens is None:
-        input_tokens = count_tokens(prompt)
+        input_tokens = getattr(agent.model, "last_input_token_count", None)
     if output_tokens is None:
-        output_tokens = count_tokens(last_thought)
+        output_tokens = getattr(agent.model, "last_output_token_count", None)
+    # Подсчёт токенов откладывается до записи лога (в фоновом режиме — в потоке логгера)
+    if input_tokens is None:
+        input_tokens = lambda: count_tokens(prompt)
+    if output_tokens is None:
+        output_tokens = lambda: count_tokens(last_thought)
+
+    # Инструменты, реально вызванные за запуск, в порядке первого вызова
+    tools_used = list(dict.fromkeys(trace.attributes.get("tools", [])))
 
     log_agent_call(
         user_input=task,
-        tool_used="Auto",  # опционально — можно расширить извлечением tool name
-        duration=round(end - start, 2),
+        tool_used=", ".join(tools_used) or "Auto",
+        duration=duration,
         input_tokens=input_tokens,
         output_tokens=output_tokens,
-        final_answer=str(result),
+        final_answer=str(result) if result is not None else "",
         agent_thought=last_thought,
+        error=error,
     )
-
-    return result
+    log_trace(trace.to_dict())
@@ -0,0 +1,104 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+TOKEN_RE = re.compile(r"[а-яa-z0-9]+")
+
+STOP_WORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по
+только ее мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если
+уже или ни быть был него до вас нибудь опять уж вам ведь там потом себя ничего ей
+может они тут где есть надо ней для мы тебя их чем была сам чтоб без будто чего раз
+тоже себе под будет ж тогда кто этот того потому этого какой совсем ним здесь этом
+один почти мой тем чтобы нее были куда зачем всех никогда можно при наконец два об
+другой хоть после над больше тот через эти нас про всего них какая много разве три
+эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им более
+всегда конечно всю между который которые которых которой также либо
+""".split())
+
+# Окончания для лёгкого стемминга, от длинных к коротким
+SUFFIXES = tuple(sorted("""
+ами ями ого его ому ему ыми ими ая яя ое ее ые ие ой ей ый ий ую юю ом ем ам ям ах ях
+ов ев ей ию ия ье ья ью ть ться тся
+ость ости остью ств ство ства ству ством стве ение ения ению ением ении ений ениям
+ениями ениях ация ации аций циями ая а я о е ы и у ю ь
+""".split(), key=len, reverse=True))
+
+MIN_STEM_LEN = 3
+
+
+def stem(word: str) -> str:
+    """Отрезает наиболее длинное подходящее окончание русского слова."""
+    if word.isdigit() or len(word) <= MIN_STEM_LEN + 1:
+        return word
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LEN:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Приводит текст к списку стемов без стоп-слов."""
+    words = TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    return [stem(w) for w in words if w not in STOP_WORDS]
+
+
+class BM25Index:
+    """
+    Инвертированный индекс с ранжированием BM25.
+
+    Для каждого терма хранится список постингов (номер документа, частота),
+    поэтому запрос обходит только постинги своих термов, а не весь корпус.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        self.avg_doc_length = 0.0
+        self._idf: Dict[str, float] = {}
+
+    @classmethod
+    def build(cls, texts: Iterable[str], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        for doc_id, text in enumerate(texts):
+            terms = Counter(tokenize(text))
+            index.doc_lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                index.postings.setdefault(term, []).append((doc_id, tf))
+        index._finalize()
+        return index
+
+    def _finalize(self) -> None:
+        n_docs = len(self.doc_lengths)
+        self.avg_doc_length = (sum(self.doc_lengths) / n_docs) if n_docs else 0.0
+        self._idf = {
+            term: math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """Возвращает до k пар (номер документа, оценка) по убыванию релевантности."""
+        if not self.doc_lengths:
+            return []
+
+        scores: Dict[int, float] = {}
+        k1, b, avg_len = self.k1, self.b, self.avg_doc_length or 1.0
+        lengths = self.doc_lengths
+
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self._idf[term]
+            for doc_id, tf in plist:
+                norm = k1 * (1 - b + b * lengths[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
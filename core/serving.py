@@ -0,0 +1,261 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from core.runner import run_and_log
+from core.tracing import TracedModel, default_tracer, observe
+
+
+class ServerBusy(RuntimeError):
+    """Очередь запросов заполнена: клиенту стоит повторить запрос позже."""
+
+
+class _Request:
+    def __init__(self, task: str, deadline: Optional[float]):
+        self.task = task
+        self.deadline = deadline
+        self.queued_at = time.monotonic()
+        self.future: Future = Future()
+
+
+class _Session:
+    def __init__(self):
+        self.steps: List[Any] = []
+        # Переменные кода сессии: agent.python_executor.state и agent.state; None — ещё не запускалась
+        self.executor_state: Optional[Dict[str, Any]] = None
+        self.agent_state: Optional[Dict[str, Any]] = None
+        self.pending: "deque[_Request]" = deque()
+        self.busy = False  # запрос сессии выполняется или уже передан в пул потоков
+        self.last_used = time.monotonic()
+
+
+class AgentServer:
+    """
+    Параллельное обслуживание нескольких пользователей одним набором тяжёлых ресурсов.
+
+    agent_factory вызывается pool_size раз при старте; фабрика должна передавать
+    каждому агенту одни и те же экземпляры модели и инструментов (индекс нормативных
+    документов, HTTP-клиент), а агент отличается только своей памятью. Модель каждого
+    агента оборачивается в TracedModel(shared=True): токены в трассах и логах берутся
+    из ответа конкретного вызова, а не из атрибутов общего клиента, которые
+    перезаписывают параллельные сессии.
+
+    Память сессии хранится отдельно от агентов: перед запуском её шаги и переменные
+    (agent.memory.steps, состояние исполнителя кода agent.python_executor.state
+    и agent.state) подставляются в свободного агента, после — забираются обратно,
+    и агент возвращается в пул чистым. agent.run(reset=...) сбрасывает только память,
+    поэтому без этого переменные, созданные кодом одного пользователя (например,
+    текст извлечённого договора), были бы видны следующей сессии на том же агенте. Запросы одной сессии ждут в её собственной очереди
+    (FIFO), и в пул потоков передаётся не больше одного запроса сессии за раз:
+    следующий отправляется, когда завершится текущий. Поэтому поток пула никогда
+    не простаивает в ожидании сессии, а разные сессии выполняются параллельно,
+    не больше pool_size одновременно.
+
+    Ожидающих запросов не больше max_queue: при переполнении submit сразу бросает
+    ServerBusy. У каждого запроса есть срок (timeout): если он истёк до начала
+    выполнения, запрос не запускается; если во время выполнения — вызывающий
+    получает TimeoutError, а агент дорабатывает шаг в фоне и возвращается в пул.
+    """
+
+    def __init__(self, agent_factory: Callable[[], Any], pool_size: int = 4, max_queue: int = 32,
+                 default_timeout: Optional[float] = 120.0, max_sessions: int = 1000,
+                 session_ttl: Optional[float] = 3600.0, run_func: Callable = run_and_log):
+        self.pool_size = pool_size
+        self.max_queue = max_queue
+        self.default_timeout = default_timeout
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.run_func = run_func
+        self.stats: Dict[str, int] = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "expired": 0}
+
+        self._agents: "queue.Queue" = queue.Queue()
+        self._clean_states: Dict[int, tuple] = {}
+        for _ in range(pool_size):
+            self._agents.put(self._prepare(agent_factory()))
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size + max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="AgentServer")
+        self._closed = False
+
+    def submit(self, session_id: str, task: str, timeout: Optional[float] = None) -> Future:
+        """Ставит запрос в очередь сессии и сразу возвращает Future с ответом агента."""
+        if self._closed:
+            raise RuntimeError("AgentServer остановлен")
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise ServerBusy(f"Очередь запросов заполнена ({self.max_queue})")
+        self._count("submitted")
+
+        timeout = self.default_timeout if timeout is None else timeout
+        request = _Request(task, time.monotonic() + timeout if timeout is not None else None)
+        request.future.add_done_callback(lambda _: self._slots.release())
+
+        with self._sessions_lock:
+            session = self._session(session_id)
+            session.pending.append(request)
+            if session.busy:
+                return request.future
+            session.busy = True
+        self._dispatch(session)
+        return request.future
+
+    def run(self, session_id: str, task: str, timeout: Optional[float] = None) -> Any:
+        """Синхронный запрос: ждёт ответа не дольше timeout секунд."""
+        timeout = self.default_timeout if timeout is None else timeout
+        return self.submit(session_id, task, timeout).result(timeout)
+
+    async def arun(self, session_id: str, task: str, timeout: Optional[float] = None) -> Any:
+        """Асинхронный вариант run для asyncio-серверов (FastAPI, aiohttp и т.п.)."""
+        timeout = self.default_timeout if timeout is None else timeout
+        future = asyncio.wrap_future(self.submit(session_id, task, timeout))
+        return await asyncio.wait_for(future, timeout)
+
+    def end_session(self, session_id: str) -> None:
+        """Удаляет память сессии."""
+        with self._sessions_lock:
+            self._sessions.pop(session_id, None)
+
+    def session_count(self) -> int:
+        with self._sessions_lock:
+            return len(self._sessions)
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Останавливает пул потоков. При wait=True дожидается запросов, уже переданных
+        в пул; запросы, ещё ждущие в очередях сессий, завершаются ошибкой.
+        """
+        self._closed = True
+        with self._sessions_lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            self._fail_pending(session, RuntimeError("AgentServer остановлен"))
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _prepare(self, agent):
+        model = getattr(agent, "model", None)
+        if isinstance(model, TracedModel):
+            model.shared = True
+        elif model is not None:
+            agent.model = TracedModel(model, default_tracer, shared=True)
+        # Исходные переменные агента, с которых начинает каждая новая сессия
+        self._clean_states[id(agent)] = (dict(_executor_state(agent) or {}), dict(getattr(agent, "state", None) or {}))
+        return agent
+
+    def _dispatch(self, session: _Session) -> None:
+        try:
+            self._executor.submit(self._run_next, session)
+        except RuntimeError as e:  # пул уже остановлен
+            self._fail_pending(session, e)
+
+    def _fail_pending(self, session: _Session, error: BaseException) -> None:
+        with self._sessions_lock:
+            requests = list(session.pending)
+            session.pending.clear()
+        for request in requests:
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_exception(error)
+
+    def _next_request(self, session: _Session) -> Optional[_Request]:
+        """Следующий запрос сессии, который ещё нужно выполнить; None и снятие busy, если таких нет."""
+        while True:
+            with self._sessions_lock:
+                if not session.pending:
+                    session.busy = False
+                    session.last_used = time.monotonic()
+                    return None
+                request = session.pending.popleft()
+
+            if not request.future.set_running_or_notify_cancel():
+                continue  # вызывающий уже отменил запрос
+            if request.deadline is not None and time.monotonic() >= request.deadline:
+                self._count("expired")
+                request.future.set_exception(TimeoutError("Истёк срок запроса до начала выполнения"))
+                continue
+            return request
+
+    def _run_next(self, session: _Session) -> None:
+        request = self._next_request(session)
+        if request is None:
+            return
+        observe("serving.queue_wait", time.monotonic() - request.queued_at)
+
+        # В пуле потоков одновременно не больше pool_size задач, и каждая держит не больше
+        # одного агента, поэтому свободный агент здесь есть всегда.
+        agent = self._agents.get()
+        try:
+            request.future.set_result(self._run_in_session(agent, session, request.task))
+        except BaseException as e:
+            request.future.set_exception(e)
+        finally:
+            self._agents.put(agent)
+
+        with self._sessions_lock:
+            if not session.pending:
+                session.busy = False
+                session.last_used = time.monotonic()
+                return
+        # Следующий запрос сессии встаёт в конец общей очереди пула, не опережая другие сессии
+        self._dispatch(session)
+
+    def _run_in_session(self, agent, session: _Session, task: str) -> Any:
+        memory = agent.memory
+        memory.steps = list(session.steps)
+        clean_executor_state, clean_agent_state = self._clean_states[id(agent)]
+        executor = getattr(agent, "python_executor", None)
+        has_executor_state = isinstance(_executor_state(agent), dict)
+        has_agent_state = isinstance(getattr(agent, "state", None), dict)
+        if has_executor_state:
+            executor.state = dict(clean_executor_state if session.executor_state is None else session.executor_state)
+        if has_agent_state:
+            agent.state = dict(clean_agent_state if session.agent_state is None else session.agent_state)
+        try:
+            result = self.run_func(agent, task, reset=not session.steps)
+            self._count("completed")
+            return result
+        except Exception:
+            self._count("failed")
+            raise
+        finally:
+            session.steps = list(memory.steps)
+            memory.steps = []
+            if has_executor_state:
+                session.executor_state, executor.state = executor.state, dict(clean_executor_state)
+            if has_agent_state:
+                session.agent_state, agent.state = agent.state, dict(clean_agent_state)
+
+    def _session(self, session_id: str) -> _Session:
+        """Сессия по id; вызывается под _sessions_lock."""
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_used = now
+
+        # Вытесняются только простаивающие сессии: у занятой память ещё не возвращена
+        idle = [sid for sid, s in self._sessions.items() if not s.busy and s is not session]
+        excess = len(self._sessions) - self.max_sessions
+        for sid in idle[:max(0, excess)]:
+            del self._sessions[sid]
+        if self.session_ttl is not None:
+            for sid in idle[max(0, excess):]:
+                if now - self._sessions[sid].last_used > self.session_ttl:
+                    del self._sessions[sid]
+        return session
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+
+def _executor_state(agent) -> Optional[Dict[str, Any]]:
+    """Переменные локального исполнителя кода CodeAgent; None для агентов без него."""
+    state = getattr(getattr(agent, "python_executor", None), "state", None)
+    return state if isinstance(state, dict) else None
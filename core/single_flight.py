@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlightCache:
+    """
+    TTL-кэш с объединением одновременных запросов (single-flight).
+
+    Пока для ключа выполняется вычисление, остальные вызовы с тем же ключом не идут
+    в upstream, а ждут его результата. Ошибки не кэшируются: все ожидающие получают
+    исключение, а следующий вызов повторит запрос.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats: Dict[str, int] = {"hits": 0, "coalesced": 0, "upstream_calls": 0, "errors": 0}
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if time.monotonic() < expires:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return value
+                del self._entries[key]
+
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.stats["upstream_calls"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = compute()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (call.value, time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.event.set()
+        return call.value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,123 @@
+import re
+from difflib import get_close_matches
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import available_timezones
+
+# Русские названия частых городов и распространённые аббревиатуры поясов, которые модель
+# может передать вместо IANA-идентификатора
+CITY_ALIASES = {
+    "москва": "Europe/Moscow",
+    "санкт_петербург": "Europe/Moscow",
+    "петербург": "Europe/Moscow",
+    "калининград": "Europe/Kaliningrad",
+    "самара": "Europe/Samara",
+    "екатеринбург": "Asia/Yekaterinburg",
+    "омск": "Asia/Omsk",
+    "новосибирск": "Asia/Novosibirsk",
+    "красноярск": "Asia/Krasnoyarsk",
+    "иркутск": "Asia/Irkutsk",
+    "якутск": "Asia/Yakutsk",
+    "владивосток": "Asia/Vladivostok",
+    "магадан": "Asia/Magadan",
+    "камчатка": "Asia/Kamchatka",
+    "минск": "Europe/Minsk",
+    "киев": "Europe/Kyiv",
+    "астана": "Asia/Almaty",
+    "алматы": "Asia/Almaty",
+    "ташкент": "Asia/Tashkent",
+    "лондон": "Europe/London",
+    "париж": "Europe/Paris",
+    "берлин": "Europe/Berlin",
+    "стамбул": "Europe/Istanbul",
+    "дубай": "Asia/Dubai",
+    "пекин": "Asia/Shanghai",
+    "шанхай": "Asia/Shanghai",
+    "гонконг": "Asia/Hong_Kong",
+    "токио": "Asia/Tokyo",
+    "нью_йорк": "America/New_York",
+    "лос_анджелес": "America/Los_Angeles",
+    "чикаго": "America/Chicago",
+    "сидней": "Australia/Sydney",
+    "msk": "Europe/Moscow",
+    "мск": "Europe/Moscow",
+    "edt": "America/New_York",
+    "pst": "America/Los_Angeles",
+    "pdt": "America/Los_Angeles",
+    "jst": "Asia/Tokyo",
+}
+
+FUZZY_CUTOFF = 0.6
+
+# Смещение от UTC ('UTC+3', 'GMT-05:00'); в именах Etc/GMT±N знак по POSIX обратный
+_OFFSET_RE = re.compile(r"^(?:utc|gmt)?([+-])(\d{1,2})(?::?00)?$")
+
+
+def normalize_zone_name(name: str) -> str:
+    return "_".join(name.strip().lower().replace("-", " ").replace("_", " ").split())
+
+
+@lru_cache(maxsize=1)
+def zone_index() -> Dict[str, str]:
+    """
+    Индекс нормализованных имён -> IANA-идентификатор по всем доступным поясам.
+
+    Строится один раз: полные имена ('europe/moscow'), названия городов ('moscow')
+    и русские псевдонимы из CITY_ALIASES. Пояса Etc/* в индекс городов не попадают:
+    'GMT+3' в них означает UTC−3.
+    """
+    zones = sorted(available_timezones())
+    index: Dict[str, str] = {}
+    for zone in zones:
+        index[normalize_zone_name(zone)] = zone
+    for zone in zones:
+        if zone.startswith("Etc/"):
+            continue
+        # для города берём первый по алфавиту пояс, обычно это каноничный Area/City
+        index.setdefault(normalize_zone_name(zone.rsplit("/", 1)[-1]), zone)
+    for alias, zone in CITY_ALIASES.items():
+        if zone in zones:
+            index.setdefault(alias, zone)
+    return index
+
+
+def suggest_zones(name: str, n: int = 5) -> List[str]:
+    index = zone_index()
+    matches = get_close_matches(normalize_zone_name(name), list(index), n=n * 2, cutoff=FUZZY_CUTOFF)
+    suggestions = []
+    for key in matches:
+        if index[key] not in suggestions:
+            suggestions.append(index[key])
+    return suggestions[:n]
+
+
+def offset_zone(name: str) -> Optional[str]:
+    """Пояс Etc/GMT∓N для смещения вида 'UTC+3' или None, если имя не является смещением."""
+    match = _OFFSET_RE.match(name.strip().lower().replace(" ", ""))
+    if match is None:
+        return None
+    sign, hours = match.groups()
+    if int(hours) == 0:
+        return "Etc/UTC"
+    zone = f"Etc/GMT{'-' if sign == '+' else '+'}{int(hours)}"
+    return zone if zone in available_timezones() else None
+
+
+def resolve_zone(name: str) -> Tuple[Optional[str], List[str]]:
+    """
+    Сопоставляет произвольное имя пояса с IANA-идентификатором.
+
+    Принимаются только точные совпадения с индексом и смещения от UTC: похожие
+    имена ('MSK' ~ 'Omsk') возвращаются как подсказки и не подставляются молча.
+
+    Returns:
+        Tuple[Optional[str], List[str]]: (найденный пояс или None, варианты для подсказки).
+    """
+    index = zone_index()
+    key = normalize_zone_name(name)
+    if key in index:
+        return index[key], []
+    zone = offset_zone(name)
+    if zone is not None:
+        return zone, []
+    return None, suggest_zones(name)
@@ -1,6 +1,126 @@
-import tiktoken
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+# Путь к локальному BPE-файлу в формате tiktoken (например, cl100k_base.tiktoken)
+VOCAB_PATH_ENV = "TOKENIZER_VOCAB_PATH"
+# "1" — не пытаться скачивать словарь (изолированные хосты), сразу использовать оценку
+OFFLINE_ENV = "TOKENIZER_OFFLINE"
+
+CL100K_PATTERN = r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+
+CACHE_SIZE = 512
+MAX_CACHED_TEXT = 20000
+
+_APPROX_RE = re.compile(r"[а-яё]+|[a-z]+|\d+|[^\w\s]", re.IGNORECASE)
+_CYRILLIC_RE = re.compile(r"[а-яё]", re.IGNORECASE)
+
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+_cache: "OrderedDict[str, int]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _load_encoder():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    vocab_path = os.environ.get(VOCAB_PATH_ENV)
+    try:
+        if vocab_path:
+            from tiktoken.load import load_tiktoken_bpe
+            return tiktoken.Encoding(
+                name=os.path.basename(vocab_path),
+                pat_str=CL100K_PATTERN,
+                mergeable_ranks=load_tiktoken_bpe(vocab_path),
+                special_tokens={},
+            )
+        if os.environ.get(OFFLINE_ENV) == "1":
+            return None
+        return tiktoken.encoding_for_model("gpt-3.5-turbo")
+    except Exception as e:
+        print(f"[!] Токенизатор недоступен, используется приближённый подсчёт: {e}")
+        return None
+
+
+def get_encoder():
+    """Загружает энкодер при первом обращении; None, если словарь недоступен."""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        with _encoder_lock:
+            if not _encoder_loaded:
+                _encoder = _load_encoder()
+                _encoder_loaded = True
+    return _encoder
+
+
+def approximate_tokens(text: str) -> int:
+    """
+    Быстрая оценка числа токенов без словаря: кириллица ~3 символа на токен,
+    латиница ~4, числа ~3, каждый знак препинания — отдельный токен.
+    """
+    total = 0
+    for piece in _APPROX_RE.findall(text):
+        if piece[0].isdigit():
+            total += math.ceil(len(piece) / 3)
+        elif piece[0].isalpha():
+            total += math.ceil(len(piece) / (3 if _CYRILLIC_RE.match(piece) else 4))
+        else:
+            total += 1
+    return total
+
+
+def _count(text: str) -> int:
+    encoder = get_encoder()
+    return len(encoder.encode(text, disallowed_special=())) if encoder else approximate_tokens(text)
+
+
+def _cached(text: str) -> Optional[int]:
+    with _cache_lock:
+        value = _cache.get(text)
+        if value is not None:
+            _cache.move_to_end(text)
+        return value
+
+
+def _remember(text: str, value: int) -> None:
+    if len(text) > MAX_CACHED_TEXT:
+        return
+    with _cache_lock:
+        _cache[text] = value
+        _cache.move_to_end(text)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
 
-ENC = tiktoken.encoding_for_model("gpt-3.5-turbo")
 
 def count_tokens(text: str) -> int:
-    return len(ENC.encode(text)) if text else 0
+    if not text:
+        return 0
+    value = _cached(text)
+    if value is None:
+        value = _count(text)
+        _remember(text, value)
+    return value
+
+
+def count_tokens_many(texts: Sequence[str]) -> List[int]:
+    """Считает токены для списка текстов; промахи кэша кодируются одним пакетом."""
+    counts: List[Optional[int]] = [0 if not text else _cached(text) for text in texts]
+    missing = [idx for idx, value in enumerate(counts) if value is None]
+    if missing:
+        encoder = get_encoder()
+        batch = [texts[idx] for idx in missing]
+        if encoder is not None:
+            values = [len(tokens) for tokens in encoder.encode_batch(batch, disallowed_special=())]
+        else:
+            values = [approximate_tokens(text) for text in batch]
+        for idx, text, value in zip(missing, batch, values):
+            counts[idx] = value
+            _remember(text, value)
+    return counts
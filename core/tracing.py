@@ -0,0 +1,309 @@
+import bisect
+import functools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from core.tokenizer import count_tokens
+
+FINAL_ANSWER_TOOL = "final_answer"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Histogram:
+    """Гистограмма задержек с фиксированными корзинами и окном последних значений для перцентилей."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window: int = 1000):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+            self._recent.append(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            counts = list(self.counts)
+            count, total = self.count, self.total
+
+        def pct(p: float) -> Optional[float]:
+            return recent[min(len(recent) - 1, int(len(recent) * p))] if recent else None
+
+        return {
+            "count": count,
+            "sum": total,
+            "avg": total / count if count else None,
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "buckets": {**{f"le_{b:g}": c for b, c in zip(self.buckets, counts)}, "le_inf": counts[-1]},
+        }
+
+
+_histograms: Dict[str, Histogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(name: str, seconds: float) -> None:
+    with _histograms_lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+    histogram.observe(seconds)
+
+
+def histogram_snapshot() -> Dict[str, Dict[str, Any]]:
+    """Состояние всех гистограмм задержек: run, model, tool.<имя инструмента>."""
+    with _histograms_lock:
+        items = list(_histograms.items())
+    return {name: histogram.snapshot() for name, histogram in items}
+
+
+def reset_histograms() -> None:
+    with _histograms_lock:
+        _histograms.clear()
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str
+    start: float
+    duration: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    children: List["Span"] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration": round(self.duration, 6),
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+def _usage_tokens(response) -> Dict[str, Optional[int]]:
+    """Токены из ответа модели: ChatMessage.token_usage или raw.usage в формате OpenAI."""
+    usage = getattr(response, "token_usage", None)
+    if usage is not None:
+        return {"input_tokens": getattr(usage, "input_tokens", None),
+                "output_tokens": getattr(usage, "output_tokens", None)}
+    usage = getattr(getattr(response, "raw", None), "usage", None)
+    if usage is not None:
+        return {"input_tokens": getattr(usage, "prompt_tokens", None),
+                "output_tokens": getattr(usage, "completion_tokens", None)}
+    return {"input_tokens": None, "output_tokens": None}
+
+
+def messages_text(messages) -> str:
+    """Текст сообщений модели: строка или список {'role', 'content'}, где content — строка или части {'text': ...}."""
+    if messages is None:
+        return ""
+    if isinstance(messages, str):
+        return messages
+    parts = []
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", message)
+        if isinstance(content, list):
+            parts.extend(str(part.get("text", "")) if isinstance(part, dict) else str(part) for part in content)
+        elif content is not None:
+            parts.append(str(content))
+    return "\n".join(parts)
+
+
+def _response_content(response) -> str:
+    if isinstance(response, str):
+        return response
+    if isinstance(response, dict):
+        return str(response.get("content") or "")
+    return str(getattr(response, "content", None) or "")
+
+
+class TracedModel:
+    """
+    Обёртка модели одного агента: замеряет каждый вызов и хранит токены этого вызова.
+
+    Несколько агентов могут делить один клиент модели (см. core.serving.AgentServer):
+    у каждого своя обёртка, поэтому last_input_token_count / last_output_token_count
+    относятся к вызову своего агента. Токены берутся из ответа (token_usage). Если модель
+    их не возвращает, читаются атрибуты клиента сразу после вызова — но только при
+    shared=False: у общего клиента эти атрибуты перезаписывает последний вызов
+    из любого потока. Если токенов нет и там (GigaChatSmolModel не сообщает usage),
+    они считаются токенизатором по сообщениям вызова и тексту ответа, а в спане
+    ставится tokens_estimated. Остальные атрибуты проксируются в исходную модель.
+    """
+
+    def __init__(self, model, tracer: "Tracer", shared: bool = False):
+        self._model = model
+        self._tracer = tracer
+        self.shared = shared
+        self.last_input_token_count: Optional[int] = None
+        self.last_output_token_count: Optional[int] = None
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def __call__(self, *args, **kwargs):
+        return self._traced(self._model, *args, **kwargs)
+
+    def generate(self, *args, **kwargs):
+        return self._traced(self._model.generate, *args, **kwargs)
+
+    def _traced(self, func, *args, **kwargs):
+        span = Span(name="model", kind="model", start=time.time())
+        started = time.perf_counter()
+        try:
+            response = func(*args, **kwargs)
+        except Exception as e:
+            span.error = str(e) or type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            self._tracer._model_spans().append(span)
+
+        tokens = _usage_tokens(response)
+        if not self.shared:
+            if tokens["input_tokens"] is None:
+                tokens["input_tokens"] = getattr(self._model, "last_input_token_count", None)
+            if tokens["output_tokens"] is None:
+                tokens["output_tokens"] = getattr(self._model, "last_output_token_count", None)
+        if tokens["input_tokens"] is None or tokens["output_tokens"] is None:
+            span.attributes["tokens_estimated"] = True
+            if tokens["input_tokens"] is None:
+                messages = args[0] if args else kwargs.get("messages")
+                tokens["input_tokens"] = count_tokens(messages_text(messages))
+            if tokens["output_tokens"] is None:
+                tokens["output_tokens"] = count_tokens(_response_content(response))
+        span.attributes.update(tokens)
+        self.last_input_token_count = tokens["input_tokens"]
+        self.last_output_token_count = tokens["output_tokens"]
+        return response
+
+
+class Tracer:
+    """
+    Трассировка запуска агента.
+
+    instrument() один раз оборачивает forward каждого инструмента агента и модель
+    агента (TracedModel), так что время и токены каждого вызова модели замеряются
+    напрямую. После agent.run finish() проходит по agent.memory.steps и строит дерево
+    спанов run -> step -> (model..., tool...), попутно наполняя гистограммы задержек.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def instrument(self, agent) -> None:
+        if getattr(agent, "_tracer_instrumented", False):
+            return
+        for tool in getattr(agent, "tools", {}).values():
+            # final_answer — служебный шаг, а не инструмент: иначе он попадает в tool_used каждого запуска
+            if getattr(tool, "name", None) != FINAL_ANSWER_TOOL:
+                self._wrap_tool(tool)
+        if getattr(agent, "model", None) is not None and not isinstance(agent.model, TracedModel):
+            agent.model = TracedModel(agent.model, self)
+        agent._tracer_instrumented = True
+
+    def _wrap_tool(self, tool) -> None:
+        if getattr(tool, "_traced", False):
+            return
+        forward = tool.forward
+        tracer = self
+
+        @functools.wraps(forward)
+        def traced_forward(*args, **kwargs):
+            span = Span(name=tool.name, kind="tool", start=time.time())
+            started = time.perf_counter()
+            try:
+                return forward(*args, **kwargs)
+            except Exception as e:
+                span.error = str(e) or type(e).__name__
+                raise
+            finally:
+                span.duration = time.perf_counter() - started
+                tracer._tool_spans().append(span)
+
+        tool.forward = traced_forward
+        tool._traced = True
+
+    def _tool_spans(self) -> List[Span]:
+        spans = getattr(self._local, "tool_spans", None)
+        if spans is None:
+            spans = self._local.tool_spans = []
+        return spans
+
+    def _model_spans(self) -> List[Span]:
+        spans = getattr(self._local, "model_spans", None)
+        if spans is None:
+            spans = self._local.model_spans = []
+        return spans
+
+    def start(self) -> float:
+        """Сбрасывает данные текущего потока перед agent.run и возвращает время старта."""
+        self._local.tool_spans = []
+        self._local.model_spans = []
+        return time.time()
+
+    def tool_names(self) -> List[str]:
+        """Имена инструментов, вызванных в текущем потоке с последнего start()."""
+        return [span.name for span in self._tool_spans()]
+
+    def finish(self, agent, task: str, start: float, end: float, error: Optional[str] = None) -> Span:
+        tool_spans = sorted(self._tool_spans(), key=lambda span: span.start)
+        model_spans = sorted(self._model_spans(), key=lambda span: span.start)
+        root = Span(name="agent.run", kind="run", start=start, duration=end - start,
+                    attributes={"task": task[:200]}, error=error)
+
+        steps = getattr(getattr(agent, "memory", None), "steps", []) or []
+        for step in steps:
+            step_start = getattr(step, "start_time", None)
+            step_number = getattr(step, "step_number", None)
+            if step_start is None or step_number is None or step_start < start:
+                continue
+            step_end = getattr(step, "end_time", None) or end
+
+            tools = [span for span in tool_spans if step_start <= span.start <= step_end]
+            models = [span for span in model_spans if step_start <= span.start <= step_end]
+
+            step_span = Span(name=f"step_{step_number}", kind="step", start=step_start,
+                             duration=step_end - step_start,
+                             error=str(step.error) if getattr(step, "error", None) else None)
+            step_span.attributes["input_tokens"] = _sum_tokens(models, "input_tokens")
+            step_span.attributes["output_tokens"] = _sum_tokens(models, "output_tokens")
+            step_span.children = sorted(models + tools, key=lambda span: span.start)
+            root.children.append(step_span)
+
+        for span in tool_spans:
+            observe(f"tool.{span.name}", span.duration)
+        for span in model_spans:
+            observe("model", span.duration)
+        observe("run", root.duration)
+
+        root.attributes["tools"] = [span.name for span in tool_spans]
+        root.attributes["input_tokens"] = _sum_tokens(model_spans, "input_tokens")
+        root.attributes["output_tokens"] = _sum_tokens(model_spans, "output_tokens")
+        return root
+
+
+def _sum_tokens(spans: List[Span], key: str) -> Optional[int]:
+    values = [span.attributes.get(key) for span in spans]
+    values = [value for value in values if value is not None]
+    return sum(values) if values else None
+
+
+default_tracer = Tracer()
@@ -0,0 +1,128 @@
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class WarmupTask:
+    """
+    Подготовка тяжёлого ресурса (корпус, индекс) с флагом готовности.
+
+    При background=True func выполняется в фоновом потоке, и конструктор сразу
+    возвращает управление; wait(timeout) позволяет дождаться готовности. Ошибка
+    подготовки сохраняется в error. При background=False func выполняется
+    синхронно, а ошибка пробрасывается вызывающему.
+    """
+
+    def __init__(self, name: str, func: Callable[[], Any], background: bool = True):
+        self.name = name
+        self.background = background
+        self.error: Optional[BaseException] = None
+        self.seconds: Optional[float] = None
+        self._func = func
+        self._ready = threading.Event()
+        _register(self)
+
+        if background:
+            threading.Thread(target=self._run, name=f"warmup-{name}", daemon=True).start()
+        else:
+            self._run()
+            if self.error is not None:
+                raise self.error
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        try:
+            self._func()
+        except Exception as e:
+            self.error = e
+            if self.background:
+                print(f"[!] Не удалось подготовить {self.name}: {e}")
+        finally:
+            self.seconds = time.perf_counter() - started
+            self._ready.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт завершения подготовки; False, если не успела за timeout секунд."""
+        return self._ready.wait(timeout)
+
+    @property
+    def status(self) -> str:
+        if not self._ready.is_set():
+            return "warming_up"
+        return "failed" if self.error is not None else "ready"
+
+
+# По одной (последней) задаче на имя: пулы агентов и бенчмарки создают инструменты
+# многократно, и реестр не должен расти вместе с ними
+_tasks: Dict[str, WarmupTask] = {}
+_tasks_lock = threading.Lock()
+_process_start = time.perf_counter()
+
+
+def _register(task: WarmupTask) -> None:
+    with _tasks_lock:
+        _tasks.pop(task.name, None)
+        _tasks[task.name] = task
+
+
+def record_startup(name: str, seconds: float, error: Optional[BaseException] = None) -> WarmupTask:
+    """Регистрирует уже завершённую синхронную подготовку ресурса."""
+    task = WarmupTask(name, lambda: None, background=False)
+    task.seconds = seconds
+    task.error = error
+    return task
+
+
+def timed_startup(cls):
+    """Декоратор класса инструмента: время работы __init__ попадает в отчёт о запуске под cls.name."""
+    init = cls.__init__
+
+    @functools.wraps(init)
+    def __init__(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            init(self, *args, **kwargs)
+        except Exception as e:
+            record_startup(cls.name, time.perf_counter() - started, e)
+            raise
+        record_startup(cls.name, time.perf_counter() - started)
+
+    cls.__init__ = __init__
+    return cls
+
+
+def wait_all(timeout: Optional[float] = None) -> bool:
+    """Ждёт подготовки всех зарегистрированных ресурсов."""
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    with _tasks_lock:
+        tasks = list(_tasks.values())
+    for task in tasks:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not task.wait(remaining):
+            return False
+    return True
+
+
+def startup_report() -> List[Dict[str, Any]]:
+    """Состояние и время подготовки каждого инструмента и ресурса."""
+    with _tasks_lock:
+        tasks = list(_tasks.values())
+    return [{
+        "name": task.name,
+        "status": task.status,
+        "background": task.background,
+        "seconds": round(task.seconds, 3) if task.seconds is not None else None,
+        "error": str(task.error) if task.error is not None else None,
+    } for task in tasks]
+
+
+def print_startup_report() -> None:
+    print(f"🚀 Время с начала запуска: {time.perf_counter() - _process_start:.2f} с")
+    for row in startup_report():
+        if row["status"] == "warming_up":
+            print(f"   ⏳ {row['name']}: загружается")
+        elif row["status"] == "failed":
+            print(f"   ❌ {row['name']}: ошибка за {row['seconds']:.2f} с — {row['error']}")
+        else:
+            print(f"   ✅ {row['name']}: готов за {row['seconds']:.2f} с")
@@ -0,0 +1,240 @@
+"""
+Офлайн-бенчмарк поиска по нормативным документам (RegulationSearchTool).
+
+Инструмент собирается с локальной заглушкой модели, поэтому GigaChat не нужен.
+Замеряются загрузка корпуса (холодная и с кэшем), построение индекса, задержка
+запроса и качество (recall@5, MRR) на размеченных запросах из docs/retrieval_queries.jsonl,
+а затем те же шаги на синтетически увеличенных корпусах. Результат пишется в JSON,
+чтобы сравнивать задержки и память между коммитами.
+
+Запуск из корня репозитория:
+    python -m scripts.benchmark_retrieval --output logs/benchmark_retrieval.json
+
+По умолчанию корпус увеличивается в 10 и 100 раз. Масштаб 1000× (--scales 10,100,1000)
+строит корпус из ~1000 копий всех фрагментов и требует десятков ГБ памяти,
+поэтому включается только явно.
+"""
+import argparse
+import json
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+from core.chunk_store import ChunkStore
+from core.search_index import BM25Index
+from tools.regulation_tools import RegulationSearchTool
+
+TOP_K = 5
+
+
+class StubModel:
+    """Заглушка модели: возвращает фиксированный ответ, не обращаясь к сети."""
+    model_name = "stub"
+
+    def __call__(self, prompt, *args, **kwargs) -> str:
+        return "stub answer"
+
+
+def load_queries(filepath: Path | str) -> List[Dict]:
+    with open(filepath, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def is_relevant(store: ChunkStore, chunk_id: int, label: Dict) -> bool:
+    """Фрагмент релевантен, если он из ожидаемого документа и содержит все ключевые слова."""
+    if store.source(chunk_id) != label["source"]:
+        return False
+    text = _normalize(store.text(chunk_id))
+    return all(kw.lower() in text for kw in label["keywords"])
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _latency_stats(samples: Sequence[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def evaluate_queries(store: ChunkStore, index: BM25Index, queries: List[Dict],
+                     repeats: int = 5) -> Dict[str, object]:
+    """Задержка index.search и качество выдачи (recall@5, MRR) по размеченным запросам."""
+    latencies, recalls, reciprocal_ranks, per_query = [], [], [], []
+    for label in queries:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            hits = index.search(label["query"], k=TOP_K)
+            latencies.append(time.perf_counter() - start)
+
+        ranks = [rank for rank, (chunk_id, _) in enumerate(hits, 1) if is_relevant(store, chunk_id, label)]
+        recalls.append(1.0 if ranks else 0.0)
+        reciprocal_ranks.append(1.0 / ranks[0] if ranks else 0.0)
+        per_query.append({"query": label["query"], "first_relevant_rank": ranks[0] if ranks else None})
+
+    return {
+        "queries": len(queries),
+        "recall_at_5": statistics.fmean(recalls) if recalls else 0.0,
+        "mrr": statistics.fmean(reciprocal_ranks) if reciprocal_ranks else 0.0,
+        "search_latency": _latency_stats(latencies),
+        "per_query": per_query,
+    }
+
+
+def synthetic_chunks(chunks: List[Tuple[str, str]], scale: int, seed: int = 0):
+    """
+    Исходные фрагменты плюс (scale - 1) × len(chunks) отвлекающих фрагментов.
+
+    Отвлекающий фрагмент — перемешанные слова случайного исходного фрагмента из
+    вымышленного документа: словарь и длины как у корпуса, но фразы разрушены.
+    """
+    rng = random.Random(seed)
+    yield from chunks
+    for copy in range(1, scale):
+        for idx in range(len(chunks)):
+            words = chunks[rng.randrange(len(chunks))][0].split()
+            rng.shuffle(words)
+            yield " ".join(words), f"synthetic_{copy}_{idx % 100}.pdf"
+
+
+def benchmark_bundled(docs_path: str, queries: List[Dict], workdir: Path) -> Tuple[Dict, RegulationSearchTool]:
+    cache_path = str(workdir / "chunks.json")
+    store_path = str(workdir / "store")
+
+    start = time.perf_counter()
+    RegulationSearchTool(model=StubModel(), docs_path=docs_path, cache_path=cache_path, store_path=store_path,
+                         use_answer_cache=False, warmup_in_background=False)
+    cold_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tool = RegulationSearchTool(model=StubModel(), docs_path=docs_path, cache_path=cache_path,
+                                store_path=store_path, use_answer_cache=False, warmup_in_background=False)
+    warm_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = BM25Index.build(tool.store.texts())
+    index_build = time.perf_counter() - start
+
+    forward_latencies = []
+    for label in queries:
+        start = time.perf_counter()
+        tool.forward(label["query"])
+        forward_latencies.append(time.perf_counter() - start)
+
+    result = {
+        "chunks": len(tool.store),
+        "documents": len(tool.store.sources),
+        "cold_load_sec": cold_load,
+        "warm_load_sec": warm_load,
+        "index_build_sec": index_build,
+        "forward_latency": _latency_stats(forward_latencies),
+        "peak_rss_mb": _peak_rss_mb(),
+        **evaluate_queries(tool.store, index, queries),
+    }
+    result["relevant_in_corpus"] = {
+        label["query"]: sum(is_relevant(tool.store, i, label) for i in range(len(tool.store))) for label in queries
+    }
+    return result, tool
+
+
+def benchmark_scaled(base_chunks: List[Tuple[str, str]], scale: int, queries: List[Dict], workdir: Path) -> Dict:
+    start = time.perf_counter()
+    store = ChunkStore.from_chunks(synthetic_chunks(base_chunks, scale), fingerprint=f"scale-{scale}")
+    store_path = str(workdir / f"store_x{scale}")
+    store.save(store_path)
+    store = ChunkStore.open(store_path)
+    corpus_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = BM25Index.build(store.texts())
+    index_build = time.perf_counter() - start
+
+    result = {
+        "scale": scale,
+        "chunks": len(store),
+        "corpus_load_sec": corpus_load,
+        "index_build_sec": index_build,
+        "store_bytes": store.nbytes,
+        "peak_rss_mb": _peak_rss_mb(),
+        **evaluate_queries(store, index, queries),
+    }
+    store.close()
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(argv: Sequence[str] | None = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска по нормативным документам")
+    parser.add_argument("--docs-path", default="data/regulations")
+    parser.add_argument("--queries", default="docs/retrieval_queries.jsonl")
+    parser.add_argument("--scales", default="10,100",
+                        help="Множители синтетического корпуса через запятую; 1000 — только на большой машине")
+    parser.add_argument("--output", default="logs/benchmark_retrieval.json")
+    args = parser.parse_args(argv)
+
+    queries = load_queries(args.queries)
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        print("📚 Бенчмарк на исходном корпусе...")
+        report["bundled"], tool = benchmark_bundled(args.docs_path, queries, workdir)
+        base_chunks = [(tool.store.text(i), tool.store.source(i)) for i in range(len(tool.store))]
+        del tool
+
+        report["scaled"] = []
+        for scale in scales:
+            print(f"📈 Синтетический корпус ×{scale}...")
+            report["scaled"].append(benchmark_scaled(base_chunks, scale, queries, workdir))
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    bundled = report["bundled"]
+    print(f"Фрагментов: {bundled['chunks']}, холодная загрузка {bundled['cold_load_sec']:.2f} с, "
+          f"с кэшем {bundled['warm_load_sec'] * 1000:.1f} мс")
+    print(f"recall@5: {bundled['recall_at_5']:.2f}, MRR: {bundled['mrr']:.2f}, "
+          f"поиск p95: {bundled['search_latency']['p95_ms']:.2f} мс")
+    for scaled in report["scaled"]:
+        print(f"×{scaled['scale']}: {scaled['chunks']} фрагментов, индекс {scaled['index_build_sec']:.1f} с, "
+              f"поиск p95 {scaled['search_latency']['p95_ms']:.2f} мс, recall@5 {scaled['recall_at_5']:.2f}, "
+              f"MRR {scaled['mrr']:.2f}, пик RSS {scaled['peak_rss_mb']:.0f} МБ")
+    print(f"Результаты сохранены в {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
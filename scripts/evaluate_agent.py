@@ -1,10 +1,15 @@
-
 import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 from tqdm import tqdm
 
+from core.tracing import default_tracer
+
 
 def load_eval_tasks(filepath: Path | str) -> List[Dict]:
     """Загружает eval-задачи из JSONL-файла."""
@@ -23,24 +28,138 @@ def check_keywords_in_answer(answer: str, expected_keywords: List[str], mode: st
         raise ValueError("Invalid mode: choose 'strict' or 'lenient'")
 
 
+def _token_counts(agent) -> Dict[str, Optional[int]]:
+    monitor = getattr(agent, "monitor", None)
+    model = getattr(agent, "model", None)
+    input_tokens = getattr(monitor, "total_input_token_count", None)
+    output_tokens = getattr(monitor, "total_output_token_count", None)
+    if input_tokens is None:
+        input_tokens = getattr(model, "last_input_token_count", None)
+    if output_tokens is None:
+        output_tokens = getattr(model, "last_output_token_count", None)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens}
+
+
+def run_task(agent, task_obj: Dict, run_func, mode: str = "lenient", run_id: Optional[str] = None) -> Dict:
+    """Прогоняет одну задачу и возвращает запись результата с задержкой, токенами и вызовами инструментов."""
+    task = task_obj["task"]
+    expected_keywords = task_obj.get("expected_keywords", [])
+
+    default_tracer.instrument(agent)
+    started_at = default_tracer.start()
+    start = time.perf_counter()
+    error = None
+    try:
+        final_answer = run_func(agent, task)
+    except Exception as e:
+        final_answer = ""
+        error = str(e) or type(e).__name__
+    latency = time.perf_counter() - start
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "task": task,
+        "expected_keywords": expected_keywords,
+        "final_answer": str(final_answer),
+        "success": error is None and check_keywords_in_answer(str(final_answer), expected_keywords, mode=mode),
+        "error": error,
+        "run_id": run_id,
+        "started_at": started_at,
+        "latency_sec": round(latency, 3),
+        **_token_counts(agent),
+        "tool_calls": default_tracer.tool_names(),
+    }
+
+
 def evaluate(agent, tasks: List[Dict], run_func) -> List[Dict]:
     """Прогоняет задачи и собирает результаты."""
     results = []
+    run_id = datetime.utcnow().isoformat()
 
     for task_obj in tqdm(tasks, desc="🔍 Evaluating tasks"):
-        task = task_obj["task"]
-        expected_keywords = task_obj.get("expected_keywords", [])
+        results.append(run_task(agent, task_obj, run_func, run_id=run_id))
 
-        final_answer = run_func(agent, task)
-        success = check_keywords_in_answer(str(final_answer), expected_keywords, mode="lenient")
+    return results
 
-        results.append({
-            "timestamp": datetime.utcnow().isoformat(),
-            "task": task,
-            "expected_keywords": expected_keywords,
-            "final_answer": str(final_answer),
-            "success": success
-        })
+
+def load_results(filepath: Path | str) -> List[Dict]:
+    """Читает уже записанные результаты; битые строки (например, после падения) пропускаются."""
+    path = Path(filepath)
+    if not path.exists():
+        return []
+    results = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                continue
+    return results
+
+
+def evaluate_parallel(agent_factory: Callable[[], object], tasks: List[Dict], run_func,
+                      output_path: Path | str, max_workers: int = 4, resume: bool = True,
+                      mode: str = "lenient") -> List[Dict]:
+    """
+    Параллельно прогоняет задачи на пуле независимых агентов.
+
+    Каждый из max_workers потоков берёт свой экземпляр агента (создаётся agent_factory
+    при первой необходимости), поэтому память агентов не смешивается. Результаты
+    дописываются в output_path по мере завершения задач; при resume=True задачи,
+    уже успешно выполненные (без error) в файле, пропускаются, а завершившиеся ошибкой
+    прогоняются заново.
+
+    Returns:
+        List[Dict]: Ранее сохранённые и новые результаты.
+    """
+    previous = load_results(output_path) if resume else []
+    done = {r["task"] for r in previous if not r.get("error")}
+    pending = [t for t in tasks if t["task"] not in done]
+    # старые записи с ошибкой для повторяемых задач заменяются новыми результатами
+    rerun = {t["task"] for t in pending}
+    previous = [r for r in previous if r["task"] not in rerun]
+    if not resume:
+        Path(output_path).write_text("", encoding="utf-8")
+
+    run_id = datetime.utcnow().isoformat()
+    agents: "queue.Queue" = queue.Queue()
+    created = 0
+    pool_lock = threading.Lock()
+    write_lock = threading.Lock()
+
+    def acquire_agent():
+        nonlocal created
+        try:
+            return agents.get_nowait()
+        except queue.Empty:
+            pass
+        with pool_lock:
+            if created < max_workers:
+                created += 1
+                try:
+                    return agent_factory()
+                except Exception:
+                    # слот освобождается, иначе остальные потоки навсегда ждут агента в agents.get()
+                    created -= 1
+                    raise
+        return agents.get()
+
+    def worker(task_obj: Dict) -> Dict:
+        agent = acquire_agent()
+        try:
+            result = run_task(agent, task_obj, run_func, mode=mode, run_id=run_id)
+        finally:
+            agents.put(agent)
+        with write_lock:
+            with open(output_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        return result
+
+    results = list(previous)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(worker, t) for t in pending]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="🔍 Evaluating tasks"):
+            results.append(future.result())
 
     return results
 
@@ -52,8 +171,13 @@ def save_results(results: List[Dict], filepath: Path | str) -> None:
             f.write(json.dumps(r, ensure_ascii=False) + "\n")
 
 
+def _percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
 def print_summary(results: List[Dict]) -> None:
-    """Печатает сводку по успешным/неуспешным задачам."""
+    """Печатает сводку по успешным/неуспешным задачам, пропускной способности и задержкам."""
     total = len(results)
     passed = sum(r["success"] for r in results)
     failed = total - passed
@@ -63,3 +187,24 @@ def print_summary(results: List[Dict]) -> None:
     print(f"Пройдено успешно: {passed}")
     print(f"Провалено: {failed}")
     print(f"Accuracy: {round((passed / total) * 100, 2)}%")
+
+    timed = [r for r in results if r.get("latency_sec") is not None]
+    if not timed:
+        return
+
+    latencies = [r["latency_sec"] for r in timed]
+    print(f"Latency p50/p95/p99: {_percentile(latencies, 50):.2f} / "
+          f"{_percentile(latencies, 95):.2f} / {_percentile(latencies, 99):.2f} с")
+
+    # Пропускную способность считаем по последнему прогону: после resume в results есть и старые записи
+    last_run = max((r["run_id"] for r in timed if r.get("run_id")), default=None)
+    with_start = [r for r in timed if r.get("started_at") is not None and r.get("run_id") == last_run]
+    if with_start:
+        wall = max(r["started_at"] + r["latency_sec"] for r in with_start) - min(r["started_at"] for r in with_start)
+        if wall > 0:
+            print(f"Throughput: {len(with_start) / wall:.2f} задач/с ({len(with_start) / wall * 60:.1f} задач/мин)")
+
+    input_tokens = [r["input_tokens"] for r in timed if r.get("input_tokens") is not None]
+    output_tokens = [r["output_tokens"] for r in timed if r.get("output_tokens") is not None]
+    if input_tokens or output_tokens:
+        print(f"Токены: вход {sum(input_tokens)}, выход {sum(output_tokens)}")
@@ -1,10 +1,15 @@
-from newsapi import NewsApiClient
 from datetime import datetime, timedelta
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
 from smolagents import Tool
-import requests
+from zoneinfo import ZoneInfo
+from core.http_client import HttpClient, get_default_client
+from core.rates import RateCache
+from core.single_flight import SingleFlightCache
+from core.timezones import resolve_zone
+from core.warmup import timed_startup
 
 
+@timed_startup
 class NewsTool(Tool):
     """
     Инструмент для поиска новостей на русском языке за указанный период.
@@ -27,59 +32,84 @@ class NewsTool(Tool):
     }
     output_type = "string"
 
-    def __init__(self, api_key: str):
+    EVERYTHING_URL = "https://newsapi.org/v2/everything"
+    FROM_DATE = '2025-06-01'
+
+    def __init__(self, api_key: str, http_client: Optional[HttpClient] = None, cache_ttl: float = 60.0):
         super().__init__()
         if not api_key:
             raise ValueError("Необходим API ключ для NewsAPI")
-        self.client = NewsApiClient(api_key=api_key)
+        self.api_key = api_key
+        self.http_client = http_client or get_default_client()
+        self.cache = SingleFlightCache(ttl=cache_ttl)
+
+    def _get_everything(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Запрос к /v2/everything через общий HTTP-клиент (аналог NewsApiClient.get_everything)."""
+        response = self.http_client.get(self.EVERYTHING_URL, params=params, headers={"X-Api-Key": self.api_key})
+        result = response.json()
+        if result.get("status") == "error":
+            raise ValueError(f"NewsAPI: {result.get('message', result.get('code'))}")
+        response.raise_for_status()
+        return result
 
     def forward(self, query: str, sort_by: Optional[str] = None) -> str:
+        sort_by = sort_by or 'relevancy'
+        to_date = datetime.now().strftime('%Y-%m-%d')
+        # Одинаковые запросы в пределах TTL обслуживаются одним обращением к NewsAPI
+        key = (" ".join(query.lower().split()), sort_by, self.FROM_DATE, to_date)
         try:
-            # Получаем новости за период с 1 июня 2025 года
-            results = self.client.get_everything(
-                q=query,
-                from_param='2025-06-01',
-                to=datetime.now().strftime('%Y-%m-%d'),
-                language='ru',
-                sort_by=sort_by or 'relevancy',
-                page_size=5,
-                page=1
-            )
-
-            articles = results.get('articles', [])
-            
-            if not articles:
-                return f"Не найдено новостей по запросу: '{query}'"
-
-            # Форматируем результат
-            response = [
-                "📰 Топ-5 самых релевантных новостей:",
-                f"🔍 По запросу: '{query}'",
-                f"📅 Период: 1 июня - {datetime.now().strftime('%d.%m.%Y')}",
-                ""
-            ]
-
-            for idx, article in enumerate(articles[:5], 1):
-                title = article.get('title', 'Без заголовка')
-                source = article.get('source', {}).get('name', 'Неизвестный источник')
-                date = datetime.strptime(article['publishedAt'], '%Y-%m-%dT%H:%M:%SZ').strftime('%d.%m.%Y')
-                url = article.get('url', '')
-                description = article.get('description', 'Нет описания')[:150] + '...' if article.get('description') else ''
-
-                response.extend([
-                    f"{idx}. {title}",
-                    f"   📌 {description}",
-                    f"   📆 {date} | 📰 {source}",
-                    f"   🔗 Читать: {url}" if url else "",
-                    ""
-                ])
-
-            return "\n".join(response)
-
+            return self.cache.get_or_compute(key, lambda: self._search(query, sort_by, to_date))
         except Exception as e:
             return f"⚠️ Ошибка при поиске новостей: {str(e)}"
 
+    def cache_stats(self) -> Dict[str, int]:
+        """Счётчики кэша: попадания, ожидания чужого запроса и обращения к NewsAPI."""
+        return dict(self.cache.stats)
+
+    def _search(self, query: str, sort_by: str, to_date: str) -> str:
+        # Получаем новости за период с 1 июня 2025 года
+        results = self._get_everything({
+            "q": query,
+            "from": self.FROM_DATE,
+            "to": to_date,
+            "language": 'ru',
+            "sortBy": sort_by,
+            "pageSize": 5,
+            "page": 1
+        })
+
+        articles = results.get('articles', [])
+        
+        if not articles:
+            return f"Не найдено новостей по запросу: '{query}'"
+
+        # Форматируем результат
+        response = [
+            "📰 Топ-5 самых релевантных новостей:",
+            f"🔍 По запросу: '{query}'",
+            f"📅 Период: 1 июня - {datetime.now().strftime('%d.%m.%Y')}",
+            ""
+        ]
+
+        for idx, article in enumerate(articles[:5], 1):
+            title = article.get('title', 'Без заголовка')
+            source = article.get('source', {}).get('name', 'Неизвестный источник')
+            date = datetime.strptime(article['publishedAt'], '%Y-%m-%dT%H:%M:%SZ').strftime('%d.%m.%Y')
+            url = article.get('url', '')
+            description = article.get('description', 'Нет описания')[:150] + '...' if article.get('description') else ''
+
+            response.extend([
+                f"{idx}. {title}",
+                f"   📌 {description}",
+                f"   📆 {date} | 📰 {source}",
+                f"   🔗 Читать: {url}" if url else "",
+                ""
+            ])
 
+        return "\n".join(response)
+
+
+@timed_startup
 class CurrencyConversionTool(Tool):
     """Инструмент для конвертации валют с использованием API exchangerate-api.com."""
     name = "currency_converter"
@@ -91,16 +121,22 @@ class CurrencyConversionTool(Tool):
     }
     output_type = "object"
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: Optional[str] = None, rate_cache: Optional[RateCache] = None,
+                 fixture_path: Optional[str] = None, http_client: Optional[HttpClient] = None):
         """Инициализирует инструмент с ключом API.
 
         Args:
             api_key: Ключ API для exchangerate-api.com.
+            rate_cache: Общий кэш курсов. По умолчанию создаётся собственный.
+            fixture_path: Путь к локальному JSON с курсами (для офлайн-тестов) вместо запросов к API.
+            http_client: HTTP-клиент для запросов к API. По умолчанию общий для процесса.
         """
         super().__init__()
-        if not api_key:
-            raise ValueError("Необходимо предоставить ключ API для CurrencyConversionTool")
-        self.api_key = api_key
+        if rate_cache is None:
+            if not api_key and not fixture_path:
+                raise ValueError("Необходимо предоставить ключ API для CurrencyConversionTool")
+            rate_cache = RateCache(api_key=api_key, fixture_path=fixture_path, http_client=http_client)
+        self.rate_cache = rate_cache
 
     def forward(self, base_currency: str, target_currency: str, amount: float = 1.0) -> Tuple[float, float]: 
         """Выполняет конвертацию валюты.
@@ -115,14 +151,21 @@ class CurrencyConversionTool(Tool):
             conversion_rate - обменный курс между валютами, а
             conversion_result - сконвертированная сумма в целевой валюте.
         """
-        endpoint = f"https://v6.exchangerate-api.com/v6/{self.api_key}/pair/{base_currency}/{target_currency}/{amount}"
-        response = requests.get(endpoint)
-        result = response.json()
-        conversion_rate = result["conversion_rate"]
-        conversion_result = result["conversion_result"]
-        return conversion_rate, conversion_result
+        return self.rate_cache.convert(base_currency, target_currency, 1.0 if amount is None else amount)
+
+    def convert_many(self, conversions: List[Tuple[str, str, float]]) -> List[Tuple[float, float]]:
+        """Конвертирует сразу несколько сумм по одной таблице курсов.
+
+        Args:
+            conversions: Список троек (base_currency, target_currency, amount).
+
+        Returns:
+            List[Tuple[float, float]]: Пары (conversion_rate, conversion_result) в том же порядке.
+        """
+        return self.rate_cache.convert_many(conversions)
     
 
+@timed_startup
 class TimeTool(Tool):
     """Инструмент для получения текущего времени и даты для местоположения."""
     name = "time_tool"
@@ -136,16 +179,11 @@ class TimeTool(Tool):
     }
     output_type = "object"
 
-    COMMON_TIMEZONES = [
-        "Europe/Moscow", "Europe/London", "Europe/Paris", "Europe/Berlin", 
-        "America/New_York", "America/Los_Angeles", "America/Chicago",
-        "Asia/Tokyo", "Asia/Shanghai", "Asia/Dubai", "Asia/Kolkata",
-        "Australia/Sydney", "Pacific/Auckland"
-    ]
-
     def forward(self, time_zone: str = "Europe/Moscow") -> Dict[str, Any]:
         """Получает текущее время и дату для указанного часового пояса.
 
+        Время вычисляется локально по базе часовых поясов (zoneinfo), без сетевых запросов.
+
         Args:
             time_zone: Идентификатор часового пояса IANA (например, 'Europe/Moscow', 'America/New_York').
                        Полный список см. на https://en.wikipedia.org/wiki/List_of_tz_database_time_zones.
@@ -153,30 +191,30 @@ class TimeTool(Tool):
         Returns:
             Dict[str, Any]: Информация о текущем времени и дате для указанного часового пояса.
         """
-        if "/" in time_zone:
-            parts = time_zone.split("/", 1)
-            area, location = parts[0], parts[1]
-        else:
-            area, location = time_zone, 
-        
-        if location:
-            base_url = f"https://timeapi.io/api/Time/current/zone?timeZone={area}/{location}"
-        else:
-            base_url = f"https://timeapi.io/api/Time/current/zone?timeZone={area}"
-            
-        try:
-            response = requests.get(base_url)
-            response.raise_for_status()  
-            
-            result = response.json()
-            
-            if "dateTime" in result:
-                result["summary"] = f"Текущее время в {time_zone}: {result['dateTime']}"
-            
-            return result
-            
-        except requests.exceptions.RequestException as e:
-            error_message = f"Ошибка при получении данных времени: {str(e)}. "
-            suggestions = ", ".join(self.COMMON_TIMEZONES[:5])
-            error_message += f"Попробуйте один из этих распространенных часовых поясов: {suggestions}"
+        zone_name, suggestions = resolve_zone(time_zone or "Europe/Moscow")
+        if zone_name is None:
+            error_message = f"Неизвестный часовой пояс: {time_zone}. "
+            if suggestions:
+                error_message += f"Возможно, вы имели в виду: {', '.join(suggestions)}"
+            else:
+                error_message += "Укажите идентификатор IANA, например 'Europe/Moscow'."
             raise ValueError(error_message)
+
+        now = datetime.now(ZoneInfo(zone_name))
+        result = {
+            "year": now.year,
+            "month": now.month,
+            "day": now.day,
+            "hour": now.hour,
+            "minute": now.minute,
+            "seconds": now.second,
+            "milliSeconds": now.microsecond // 1000,
+            "dateTime": now.replace(tzinfo=None).isoformat(),
+            "date": now.strftime("%m/%d/%Y"),
+            "time": now.strftime("%H:%M"),
+            "timeZone": zone_name,
+            "dayOfWeek": now.strftime("%A"),
+            "dstActive": bool(now.dst()),
+        }
+        result["summary"] = f"Текущее время в {zone_name}: {result['dateTime']}"
+        return result
@@ -1,11 +1,111 @@
 import os
-import pdfplumber
-from docx import Document
-from typing import Optional
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 from smolagents import Tool
-from gigasmol import GigaChatSmolModel
+from core.chunk_cache import file_sha256
+from core.context_packer import Fragment, pack_context
+from core.ingestion import DEFAULT_WORKERS, extract_text_budgeted, ingest_file, is_supported, process_pool
+from core.llm import call_with_retries, map_concurrent, model_name, response_text
+from core.result_cache import ResultCache, make_key, normalize_text
+from core.warmup import timed_startup
 
+if TYPE_CHECKING:
+    from gigasmol import GigaChatSmolModel
 
+FILE_KINDS = {".pdf": "PDF", ".docx": "DOCX", ".txt": "TXT"}
+UNSUPPORTED_FORMAT = "Формат файла не поддерживается. Используйте PDF, DOCX или TXT."
+
+
+def extract_document_text(file_path: str, full_document: bool = False, max_chars: Optional[int] = None,
+                          max_tokens: Optional[int] = None, ingest_workers: Optional[int] = None) -> str:
+    """Извлекает текст PDF/DOCX/TXT: весь документ или только начало в пределах бюджета."""
+    kind = FILE_KINDS.get(os.path.splitext(file_path)[1].lower())
+    if kind is None:
+        raise ValueError(UNSUPPORTED_FORMAT)
+
+    if full_document:
+        result = ingest_file(file_path, max_workers=ingest_workers)
+        if not result.ok:
+            raise ValueError(f"Ошибка при чтении {kind}: {result.error}")
+        return "\n".join(page for page in result.pages if page)
+
+    # Извлекаем страницы лениво и только в пределах бюджета промпта
+    try:
+        return extract_text_budgeted(file_path, max_chars=max_chars, max_tokens=max_tokens,
+                                     max_workers=ingest_workers or 1)
+    except Exception as e:
+        raise ValueError(f"Ошибка при чтении {kind}: {e}")
+
+
+def _timed_extract(file_path: str, full_document: bool, max_chars: Optional[int],
+                   max_tokens: Optional[int]) -> Tuple[str, float]:
+    """Извлечение одного документа пакета; выполняется в процессе-воркере."""
+    start = time.perf_counter()
+    text = extract_document_text(file_path, full_document, max_chars, max_tokens, ingest_workers=1)
+    return text, time.perf_counter() - start
+
+
+@dataclass
+class DocumentResult:
+    """Результат анализа одного документа пакета."""
+    path: str
+    analysis: Optional[str] = None
+    error: Optional[str] = None
+    stage: Optional[str] = None  # этап, на котором произошла ошибка: extract или analyze
+    chars: int = 0
+    extract_seconds: float = 0.0
+    analysis_seconds: float = 0.0
+    cached_text: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BatchReport:
+    """Сводка пакетного анализа: результаты по файлам, время и пропускная способность."""
+    results: List[DocumentResult] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for r in self.results if r.ok)
+
+    @property
+    def failed(self) -> int:
+        return len(self.results) - self.succeeded
+
+    @property
+    def throughput_per_min(self) -> float:
+        return len(self.results) / self.seconds * 60 if self.seconds else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "documents": len(self.results),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "seconds": round(self.seconds, 3),
+            "throughput_per_min": round(self.throughput_per_min, 2),
+            "results": [asdict(r) for r in self.results],
+        }
+
+    def print_summary(self) -> None:
+        print(f"📦 Документов: {len(self.results)}, успешно: {self.succeeded}, с ошибками: {self.failed}")
+        print(f"⏱ Общее время: {self.seconds:.1f} с, пропускная способность: {self.throughput_per_min:.1f} док/мин")
+        for r in self.results:
+            name = os.path.basename(r.path)
+            timings = f"извлечение {r.extract_seconds:.2f} с, анализ {r.analysis_seconds:.2f} с"
+            if r.ok:
+                print(f"   ✅ {name}: {timings}")
+            else:
+                print(f"   ❌ {name} ({r.stage}): {r.error}")
+
+
+@timed_startup
 class ContractAnalyzerTool(Tool):
     """
     Инструмент анализа текста договора или описания услуги.
@@ -19,20 +119,46 @@ class ContractAnalyzerTool(Tool):
 
     inputs = {
         "text": {"type": "string", "description": "Текст договора или условий для анализа", "nullable": True},
-        "file_path": {"type": "string", "description": "Путь к загруженному PDF или DOCX файлу", "nullable": True}
+        "file_path": {"type": "string", "description": "Путь к загруженному PDF, DOCX или TXT файлу", "nullable": True},
+        "full_document": {
+            "type": "boolean",
+            "description": "Проанализировать весь документ по разделам (для длинных договоров). По умолчанию анализируется только начало.",
+            "nullable": True
+        }
     }
 
     output_type = "string"
 
-    def __init__(self, model: Optional[GigaChatSmolModel] = None):
+    MAX_DOCUMENT_CHARS = 6000
+    CONTEXT_TOKENS = 2000  # бюджет текста договора в промпте без анализа по разделам
+    PROMPT_VERSION = "2"  # увеличивать при изменении промптов, чтобы не отдавать старые ответы из кэша
+    DEFAULT_CACHE_PATH = "data/cache/contract_cache.sqlite"
+
+    def __init__(self, model: Optional["GigaChatSmolModel"] = None, ingest_workers: Optional[int] = None,
+                 max_chars: int = MAX_DOCUMENT_CHARS, max_tokens: Optional[int] = None,
+                 max_concurrency: int = 4, llm_timeout: Optional[float] = 120.0, llm_retries: int = 2,
+                 cache: Optional[ResultCache] = None, use_cache: bool = True,
+                 context_tokens: int = CONTEXT_TOKENS):
         super().__init__()
         if model is None:
             raise ValueError("Необходимо передать модель GigaChat для ContractAnalyzerTool.")
         self.model = model
+        self.ingest_workers = ingest_workers
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.max_concurrency = max_concurrency
+        self.llm_timeout = llm_timeout
+        self.llm_retries = llm_retries
+        self.context_tokens = context_tokens
+        if use_cache and cache is None:
+            cache = ResultCache(self.DEFAULT_CACHE_PATH)
+        self.cache = cache if use_cache else None
 
-    def forward(self, text: Optional[str] = None, file_path: Optional[str] = None) -> str:
+    def forward(self, text: Optional[str] = None, file_path: Optional[str] = None,
+                full_document: Optional[bool] = False) -> str:
+        full_document = bool(full_document)
         if file_path:
-            extracted_text = self._extract_text_from_file(file_path)
+            extracted_text = self._extract_text_cached(file_path, full_document)
             if not extracted_text:
                 raise ValueError("Не удалось извлечь текст из файла.")
         elif text:
@@ -40,30 +166,191 @@ class ContractAnalyzerTool(Tool):
         else:
             raise ValueError("Необходимо либо указать текст, либо путь к файлу.")
 
-        prompt = self._build_prompt(extracted_text)
-
-        print(prompt)
-
-        response = self.model(prompt)
-        return response
-
-    def _extract_text_from_file(self, file_path: str) -> str:
-        if file_path.lower().endswith(".pdf"):
-            try:
-                with pdfplumber.open(file_path) as pdf:
-                    return "\n".join(page.extract_text() or "" for page in pdf.pages if page.extract_text())
-            except Exception as e:
-                raise ValueError(f"Ошибка при чтении PDF: {e}")
-        elif file_path.endswith(".docx"):
-            try:
-                doc = Document(file_path)
-                return "\n".join([para.text for para in doc.paragraphs])
-            except Exception as e:
-                raise ValueError(f"Ошибка при чтении DOCX: {e}")
+        return self._analyze_text(extracted_text, full_document)
+
+    def _analyze_text(self, extracted_text: str, full_document: bool, max_concurrency: Optional[int] = None) -> str:
+        use_sections = full_document and len(extracted_text) > self.max_chars
+        document_text = extracted_text if use_sections else extracted_text[:self.max_chars]
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_key("analysis", self.PROMPT_VERSION, model_name(self.model), use_sections,
+                                 self.context_tokens, normalize_text(document_text))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                print("[ContractAnalyzerTool] Ответ взят из кэша")
+                return cached
+
+        if use_sections:
+            result = self._analyze_by_sections(document_text, max_concurrency)
         else:
-            raise ValueError("Формат файла не поддерживается. Используйте PDF или DOCX.")
+            prompt = self._build_prompt(document_text)
+
+            print(prompt)
+
+            result = response_text(self.model(prompt))
+
+        if cache_key is not None:
+            self.cache.put(cache_key, result)
+        return result
+
+    def iter_batch(self, paths: Union[str, Path, Sequence[Union[str, Path]]], full_document: bool = False,
+                   extract_workers: Optional[int] = None, analysis_workers: Optional[int] = None
+                   ) -> Iterator[DocumentResult]:
+        """
+        Анализирует пакет документов и отдаёт результаты по мере готовности.
+
+        Извлечение текста (CPU) выполняется пулом процессов, анализ моделью (I/O) —
+        пулом потоков, и этапы идут конвейером: пока модель анализирует одни
+        документы, из следующих уже извлекается текст. Новые файлы берутся в работу,
+        только когда в очереди на анализ не больше 2 × analysis_workers документов,
+        поэтому память не растёт с размером пакета. Ошибка в одном документе
+        не прерывает обработку остальных.
+
+        Args:
+            paths: Каталог (файлы .pdf/.docx/.txt в нём) или список путей к файлам.
+            full_document: Анализировать документы целиком по разделам.
+            extract_workers: Размер пула процессов извлечения (по умолчанию INGEST_WORKERS или число ядер).
+            analysis_workers: Число одновременных анализов (по умолчанию max_concurrency).
+                Разделы одного документа в пакете анализируются последовательно, поэтому
+                одновременных запросов к модели не больше analysis_workers.
+        """
+        files = self.collect_files(paths)
+        extract_workers = max(1, min(extract_workers or DEFAULT_WORKERS, len(files) or 1))
+        analysis_workers = max(1, analysis_workers or self.max_concurrency)
+
+        pending = list(reversed(files))
+        extracting: Dict = {}
+        analyzing: Dict = {}
+        extract_pool = process_pool(extract_workers)
+        analysis_pool = ThreadPoolExecutor(max_workers=analysis_workers, thread_name_prefix="ContractAnalysis")
+
+        def analyze(result: DocumentResult, text: str) -> None:
+            result.chars = len(text)
+            analyzing[analysis_pool.submit(self._timed_analysis, text, full_document, 1)] = result
+
+        try:
+            while pending or extracting or analyzing:
+                while pending and len(extracting) < extract_workers and len(analyzing) < 2 * analysis_workers:
+                    result = DocumentResult(path=pending.pop())
+                    if not is_supported(result.path):
+                        result.error, result.stage = UNSUPPORTED_FORMAT, "extract"
+                        yield result
+                        continue
+                    try:
+                        key = self._extract_key(result.path, full_document)
+                    except ValueError as e:
+                        result.error, result.stage = str(e), "extract"
+                        yield result
+                        continue
+                    cached = self.cache.get(key) if key else None
+                    if cached is not None:
+                        result.cached_text = True
+                        analyze(result, cached)
+                        continue
+                    future = extract_pool.submit(_timed_extract, result.path, full_document,
+                                                 self.max_chars, self.max_tokens)
+                    extracting[future] = (result, key)
+
+                if not (extracting or analyzing):
+                    continue
+                done, _ = wait(list(extracting) + list(analyzing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in extracting:
+                        result, key = extracting.pop(future)
+                        try:
+                            text, result.extract_seconds = future.result()
+                            if not text:
+                                raise ValueError("Не удалось извлечь текст из файла.")
+                        except Exception as e:
+                            result.error, result.stage = str(e) or type(e).__name__, "extract"
+                            yield result
+                            continue
+                        if key:
+                            self.cache.put(key, text)
+                        analyze(result, text)
+                    else:
+                        result = analyzing.pop(future)
+                        try:
+                            result.analysis, result.analysis_seconds = future.result()
+                        except Exception as e:
+                            result.error, result.stage = str(e) or type(e).__name__, "analyze"
+                        yield result
+        finally:
+            extract_pool.shutdown(wait=False, cancel_futures=True)
+            analysis_pool.shutdown(wait=False, cancel_futures=True)
+
+    def analyze_batch(self, paths: Union[str, Path, Sequence[Union[str, Path]]], full_document: bool = False,
+                      extract_workers: Optional[int] = None, analysis_workers: Optional[int] = None,
+                      on_result: Optional[Callable[[DocumentResult], None]] = None) -> BatchReport:
+        """
+        Пакетный анализ с итоговой сводкой.
+
+        Каждый готовый результат сразу печатается и передаётся в on_result
+        (например, чтобы отправить его пользователю, не дожидаясь всего пакета).
+        """
+        report = BatchReport()
+        start = time.perf_counter()
+        for result in self.iter_batch(paths, full_document, extract_workers, analysis_workers):
+            report.results.append(result)
+            status = "✅" if result.ok else "❌"
+            print(f"{status} [{len(report.results)}] {os.path.basename(result.path)}: "
+                  f"{result.extract_seconds + result.analysis_seconds:.2f} с")
+            if on_result is not None:
+                on_result(result)
+        report.seconds = time.perf_counter() - start
+        return report
+
+    @staticmethod
+    def collect_files(paths: Union[str, Path, Sequence[Union[str, Path]]]) -> List[str]:
+        """Список файлов пакета: содержимое каталога (.pdf/.docx/.txt) или переданные пути."""
+        if isinstance(paths, (str, Path)):
+            directory = Path(paths)
+            if not directory.is_dir():
+                return [str(directory)]
+            return [str(p) for p in sorted(directory.iterdir()) if p.is_file() and is_supported(p.name)]
+        return [str(p) for p in paths]
+
+    def _timed_analysis(self, text: str, full_document: bool,
+                        max_concurrency: Optional[int] = None) -> Tuple[str, float]:
+        start = time.perf_counter()
+        analysis = self._analyze_text(text, full_document, max_concurrency)
+        return analysis, time.perf_counter() - start
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Счётчики попаданий и промахов кэша результатов."""
+        return dict(self.cache.stats) if self.cache is not None else {}
+
+    def _extract_key(self, file_path: str, full_document: bool) -> Optional[str]:
+        if self.cache is None:
+            return None
+        try:
+            digest = file_sha256(file_path)
+        except OSError as e:
+            raise ValueError(f"Не удалось прочитать файл: {e}")
+        return make_key("extract", digest, full_document, self.max_chars, self.max_tokens)
+
+    def _extract_text_cached(self, file_path: str, full_document: bool) -> str:
+        """Извлекает текст файла, переиспользуя результат для файлов с тем же содержимым."""
+        key = self._extract_key(file_path, full_document)
+        extracted_text = self.cache.get(key) if key else None
+        if extracted_text is None:
+            extracted_text = self._extract_text_from_file(file_path, full_document=full_document)
+            if key and extracted_text:
+                self.cache.put(key, extracted_text)
+        return extracted_text
+
+    def _extract_text_from_file(self, file_path: str, full_document: bool = False) -> str:
+        return extract_document_text(file_path, full_document=full_document, max_chars=self.max_chars,
+                                     max_tokens=self.max_tokens, ingest_workers=self.ingest_workers)
 
     def _build_prompt(self, document_text: str) -> str:
+        # Начало документа по абзацам в пределах бюджета токенов, без обрыва посреди предложения
+        context = pack_context((Fragment(paragraph) for paragraph in document_text.split("\n") if paragraph.strip()),
+                               max_tokens=self.context_tokens, strategy="rank")
+        print(f"[ContractAnalyzerTool] Контекст: {context.summary()}")
+        document_context = context.render(template="{text}", separator="\n")
+
         return f"""
         Вы выступаете как консультант по финансовым услугам.
         
@@ -73,5 +360,114 @@ class ContractAnalyzerTool(Tool):
         Предоставьте краткую, понятную сводку текста ниже и выделите потенциальные «опасные» места.
 
         Текст документа:
-        {document_text[:6000]}
+        {document_context}
+        """
+
+    def _analyze_by_sections(self, document_text: str, max_concurrency: Optional[int] = None) -> str:
+        """
+        Map-reduce анализ длинного документа.
+
+        Разделы анализируются параллельно (не более max_concurrency запросов к модели
+        одновременно, по умолчанию self.max_concurrency), затем выводы сводятся
+        в единое резюме рисков.
+        """
+        max_concurrency = max_concurrency or self.max_concurrency
+        sections = self._split_sections(document_text, self.max_chars)
+        print(f"[ContractAnalyzerTool] Анализирую документ по разделам: {len(sections)}")
+
+        prompts = [self._build_section_prompt(section, idx, len(sections)) for idx, section in enumerate(sections, 1)]
+        outcomes = map_concurrent(self.model, prompts, max_concurrency=max_concurrency,
+                                  timeout=self.llm_timeout, retries=self.llm_retries)
+
+        findings = []
+        for idx, (answer, error) in enumerate(outcomes, 1):
+            if error:
+                print(f"[!] Раздел {idx} не проанализирован: {error}")
+                findings.append(f"Раздел {idx}: анализ не выполнен ({error}).")
+            else:
+                findings.append(f"Раздел {idx}:\n{answer}")
+
+        if all(error for _, error in outcomes):
+            raise RuntimeError("Не удалось проанализировать ни один раздел документа.")
+
+        findings = self._reduce_hierarchically(findings, max_concurrency)
+        return call_with_retries(self.model, self._build_reduce_prompt(findings),
+                                 timeout=self.llm_timeout, retries=self.llm_retries)
+
+    def _reduce_hierarchically(self, findings: List[str], max_concurrency: int) -> List[str]:
+        """
+        Сводит выводы группами, пока их общий объём не поместится в один промпт (max_chars).
+
+        Группа набирается подряд идущими выводами в пределах max_chars, но не меньше двух,
+        поэтому число выводов на каждом уровне строго уменьшается.
+        """
+        level = 0
+        while len(findings) > 1 and len("\n\n".join(findings)) > self.max_chars:
+            level += 1
+            groups, current, size = [], [], 0
+            for finding in findings:
+                if len(current) >= 2 and size + len(finding) > self.max_chars:
+                    groups.append(current)
+                    current, size = [], 0
+                current.append(finding)
+                size += len(finding) + 2
+            if len(current) == 1 and groups:
+                groups[-1].extend(current)
+            elif current:
+                groups.append(current)
+            print(f"[ContractAnalyzerTool] Промежуточная свёртка {level}: {len(findings)} -> {len(groups)}")
+
+            prompts = [self._build_reduce_prompt(group) for group in groups]
+            outcomes = map_concurrent(self.model, prompts, max_concurrency=max_concurrency,
+                                      timeout=self.llm_timeout, retries=self.llm_retries)
+            findings = []
+            for idx, ((answer, error), group) in enumerate(zip(outcomes, groups), 1):
+                if error:
+                    print(f"[!] Группа {idx} не свёрнута: {error}")
+                    # оставляем исходные выводы, обрезанные до доли бюджета, чтобы объём всё равно сокращался
+                    answer = "\n\n".join(group)[:self.max_chars // 2]
+                findings.append(f"Часть {idx}:\n{answer}")
+        return findings
+
+    @staticmethod
+    def _split_sections(document_text: str, max_chars: int) -> List[str]:
+        """Делит текст на разделы не длиннее max_chars по границам абзацев."""
+        sections, current, size = [], [], 0
+        for paragraph in document_text.split("\n"):
+            # слишком длинный абзац режем на части фиксированной длины
+            pieces = [paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars)] or [""]
+            for piece in pieces:
+                if current and size + len(piece) + 1 > max_chars:
+                    sections.append("\n".join(current))
+                    current, size = [], 0
+                current.append(piece)
+                size += len(piece) + 1
+        if current:
+            sections.append("\n".join(current))
+        return [section for section in sections if section.strip()]
+
+    def _build_section_prompt(self, section_text: str, idx: int, total: int) -> str:
+        return f"""
+        Вы выступаете как консультант по финансовым услугам.
+
+        Ниже приведён раздел {idx} из {total} длинного договора или описания услуги.
+        Перечислите кратко все важные для клиента условия этого раздела и отметьте
+        потенциальные «опасные» места: комиссии, штрафы, односторонние изменения, ограничения.
+        Если существенных условий нет, так и напишите.
+
+        Текст раздела:
+        {section_text}
+        """
+
+    def _build_reduce_prompt(self, findings: List[str]) -> str:
+        joined = "\n\n".join(findings)
+        return f"""
+        Вы выступаете как консультант по финансовым услугам.
+
+        Ниже приведены выводы по отдельным разделам одного договора.
+        Объедините их в единую краткую, понятную сводку для клиента: главные условия
+        и перечень потенциально «опасных» мест. Уберите повторы.
+
+        Выводы по разделам:
+        {joined}
         """
@@ -1,12 +1,19 @@
+import hashlib
 import os
 import re
-import pdfplumber
-from docx import Document as DocxDocument
-from difflib import get_close_matches
-from typing import Optional, List, Dict
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from typing import TYPE_CHECKING, Optional, List, Dict, Tuple
 from smolagents import Tool
-from gigasmol import GigaChatSmolModel
+from core.chunk_cache import ChunkCache
+from core.chunk_store import ChunkStore
+from core.context_packer import Fragment, pack_context
+from core.ingestion import ingest_files, is_supported
+from core.llm import model_name, response_text
+from core.result_cache import ResultCache, make_key, normalize_text
+from core.search_index import BM25Index
+from core.warmup import WarmupTask
+
+if TYPE_CHECKING:
+    from gigasmol import GigaChatSmolModel
 
 
 class RegulationSearchTool(Tool):
@@ -25,67 +32,182 @@ class RegulationSearchTool(Tool):
 
     output_type = "string"
 
-    def __init__(self, model: GigaChatSmolModel, docs_path: str = "data/regulations"):
+    CHUNK_SIZE = 1000
+    CHUNK_OVERLAP = 100
+    MIN_CHUNK_LEN = 100  # отсекаем бессмысленные короткие куски
+    SEARCH_K = 10  # кандидаты для упаковки контекста; в промпт попадает столько, сколько влезет в бюджет
+    CONTEXT_TOKENS = 1500
+    PROMPT_VERSION = "2"  # входит в ключ кэша ответов
+    ANSWER_CACHE_PATH = "data/cache/regulation_answers.sqlite"
+    READY_TIMEOUT = 30.0  # сколько forward ждёт загрузки индекса, прежде чем ответить «индекс загружается»
+
+    def __init__(self, model: "GigaChatSmolModel", docs_path: str = "data/regulations",
+                 cache_path: Optional[str] = "data/cache/regulation_chunks.json",
+                 store_path: Optional[str] = "data/cache/regulation_store",
+                 ingest_workers: Optional[int] = None,
+                 answer_cache: Optional[ResultCache] = None, use_answer_cache: bool = True,
+                 context_tokens: int = CONTEXT_TOKENS,
+                 warmup_in_background: bool = True, ready_timeout: Optional[float] = READY_TIMEOUT):
         super().__init__()
         self.model = model
+        self.context_tokens = context_tokens
         self.docs_path = docs_path
-        self.text_chunks = self._load_chunks()
-
-    def _load_chunks(self) -> List[Dict[str, str]]:
+        self.cache_path = cache_path
+        self.store_path = store_path
+        self.ingest_workers = ingest_workers
+        self.ready_timeout = ready_timeout
+        self.store: Optional[ChunkStore] = None
+        self.index: Optional[BM25Index] = None
+        self.corpus_fingerprint = ""
+
+        if use_answer_cache and answer_cache is None:
+            answer_cache = ResultCache(self.ANSWER_CACHE_PATH)
+        self.answer_cache = answer_cache if use_answer_cache else None
+
+        # Корпус и индекс загружаются в фоне, чтобы агент сразу отвечал на остальные вопросы
+        self.warmup = WarmupTask(self.name, self._warm_up, background=warmup_in_background)
+
+    def _warm_up(self) -> None:
+        self.store = self._load_chunks()
+        self.corpus_fingerprint = self._corpus_fingerprint()
+        if self.answer_cache is not None:
+            self._invalidate_stale_answers()
+        self.index = BM25Index.build(self.store.texts())
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт загрузки корпуса и индекса; False, если не успели за timeout секунд."""
+        return self.warmup.wait(timeout)
+
+    def _corpus_fingerprint(self) -> str:
+        """Отпечаток корпуса: из кэша фрагментов, а без него — хэш самих фрагментов."""
+        if self.store.fingerprint:
+            return self.store.fingerprint
+        digest = hashlib.sha256()
+        for i in range(len(self.store)):
+            digest.update(self.store.source(i).encode("utf-8"))
+            digest.update(self.store.text(i).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _invalidate_stale_answers(self) -> None:
+        """Очищает кэш ответов, если корпус изменился с момента их сохранения."""
+        if self.answer_cache.get_meta("corpus_fingerprint") != self.corpus_fingerprint:
+            self.answer_cache.clear()
+            self.answer_cache.set_meta("corpus_fingerprint", self.corpus_fingerprint)
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Счётчики попаданий и промахов кэша ответов."""
+        return dict(self.answer_cache.stats) if self.answer_cache is not None else {}
+
+    def _load_chunks(self) -> ChunkStore:
         print("[RegulationSearchTool] Загружаю документы...")
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=self.CHUNK_SIZE, chunk_overlap=self.CHUNK_OVERLAP)
+        cache = None
+        if self.cache_path:
+            cache = ChunkCache(self.cache_path, settings={
+                "chunk_size": self.CHUNK_SIZE,
+                "chunk_overlap": self.CHUNK_OVERLAP,
+                "min_chunk_len": self.MIN_CHUNK_LEN,
+            })
 
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunks = []
+        splits: Dict[str, List[str]] = {}
+        to_parse: List[str] = []
 
-        for filename in os.listdir(self.docs_path):
+        for filename in sorted(os.listdir(self.docs_path)):
             path = os.path.join(self.docs_path, filename)
             if not os.path.isfile(path):
                 continue
+            if not is_supported(filename):
+                print(f"[!] Пропущен неподдерживаемый файл: {filename}")
+                continue
 
-            content = ""
-            try:
-                ext = filename.lower()
-                if ext.endswith(".txt"):
-                    with open(path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                elif ext.endswith(".pdf"):
-                    with pdfplumber.open(path) as pdf:
-                        content = "\n".join(page.extract_text() or "" for page in pdf.pages)
-                elif ext.endswith(".docx"):
-                    doc = DocxDocument(path)
-                    content = "\n".join([p.text for p in doc.paragraphs])
-                else:
-                    print(f"[!] Пропущен неподдерживаемый файл: {filename}")
+            split = cache.get(filename, path) if cache else None
+            if split is None:
+                to_parse.append(filename)
+            else:
+                splits[filename] = split
+
+        if to_parse:
+            results = ingest_files([os.path.join(self.docs_path, name) for name in to_parse],
+                                   max_workers=self.ingest_workers)
+            for filename, result in zip(to_parse, results):
+                if not result.ok:
+                    print(f"[!] Ошибка чтения {filename}: {result.error}")
                     continue
-            except Exception as e:
-                print(f"[!] Ошибка чтения {filename}: {e}")
-                continue
+                print(f"   📄 {filename}: {len(result.pages)} стр. за {result.seconds:.2f} с")
 
-            split = splitter.split_text(content)
-            for chunk in split:
-                clean = chunk.strip()
-                if len(clean) >= 100:  # отсекаем бессмысленные короткие куски
-                    chunks.append({"text": clean, "source": filename})
+                split = [chunk.strip() for chunk in splitter.split_text(result.text)]
+                split = [chunk for chunk in split if len(chunk) >= self.MIN_CHUNK_LEN]
+                splits[filename] = split
+                if cache:
+                    cache.put(filename, result.path, split)
 
-        print(f"✅ Загружено фрагментов: {len(chunks)}")
-        return chunks
+        documents = [(filename, splits[filename]) for filename in sorted(splits)]
+
+        if cache:
+            cache.retain([filename for filename, _ in documents])
+            try:
+                cache.save()
+            except OSError as e:
+                print(f"[!] Не удалось сохранить кэш фрагментов: {e}")
+
+        store = self._build_store(documents, cache.fingerprint() if cache else "")
+        print(f"✅ Загружено фрагментов: {len(store)}")
+        return store
+
+    def _build_store(self, documents: List[Tuple[str, List[str]]], fingerprint: str) -> ChunkStore:
+        """Открывает сохранённое хранилище фрагментов или пересобирает его при изменении корпуса."""
+        if self.store_path and fingerprint:
+            store = ChunkStore.open(self.store_path, fingerprint)
+            if store is not None:
+                return store
+
+        store = ChunkStore.from_chunks(
+            ((chunk, filename) for filename, split in documents for chunk in split),
+            fingerprint=fingerprint,
+        )
+        if not (self.store_path and fingerprint):
+            return store
+
+        try:
+            store.save(self.store_path)
+        except OSError as e:
+            print(f"[!] Не удалось сохранить хранилище фрагментов: {e}")
+            return store
+        return ChunkStore.open(self.store_path, fingerprint) or store
 
     def forward(self, query: str) -> str:
         print(f"🔎 Поиск по нормативке: '{query}'")
-        texts = [ch["text"] for ch in self.text_chunks]
-        matches = get_close_matches(query, texts, n=5, cutoff=0.2)
+        if not self.warmup.wait(self.ready_timeout):
+            return "⏳ Индекс нормативных документов ещё загружается. Повторите запрос через несколько секунд."
+        if self.warmup.error is not None:
+            raise RuntimeError(f"Индекс нормативных документов не загружен: {self.warmup.error}")
+
+        matches = self.index.search(query, k=self.SEARCH_K)
 
         # Собираем контекст
         if not matches:
             return "❌ Не удалось найти подходящие фрагменты по вашему запросу."
 
-        contexts = []
-        for match in matches:
-            match_clean = match.strip().replace("\n", " ")
-            source = next((ch["source"] for ch in self.text_chunks if ch["text"] == match), "неизвестный документ")
-            contexts.append(f"[{source}]:\n{match_clean}")
-
-        full_context = "\n\n".join(contexts)
+        context = pack_context(
+            (Fragment(self.store.text(chunk_id), score, self.store.source(chunk_id), ref=chunk_id)
+             for chunk_id, score in matches),
+            max_tokens=self.context_tokens,
+        )
+        print(f"[RegulationSearchTool] Контекст: {context.summary()}")
+
+        # Одинаковый вопрос к тем же фрагментам того же корпуса не требует повторной генерации
+        cache_key = None
+        if self.answer_cache is not None:
+            cache_key = make_key("answer", self.PROMPT_VERSION, model_name(self.model), self.corpus_fingerprint,
+                                 self.context_tokens, sorted(context.refs()), normalize_text(query).lower())
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                print("[RegulationSearchTool] Ответ взят из кэша")
+                return cached
+
+        full_context = context.render()
 
         prompt = f"""
         Вы — консультант в области финансового и юридического права.
@@ -100,12 +222,8 @@ class RegulationSearchTool(Tool):
         На основе приведённых фрагментов, дайте понятный ответ. Объясните суть требований и прав клиента, укажите источники.
         """
 
-        response = self.model(prompt)
-
-        if isinstance(response, dict) and "content" in response:
-            return response["content"]
-
-        if isinstance(response, str):
-            return response.strip()
+        result = response_text(self.model(prompt))
 
-        raise TypeError("❌ Неверный тип ответа от модели: ожидается строка или {'content': ...}")
+        if cache_key is not None:
+            self.answer_cache.put(cache_key, result)
+        return result
@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from utils.log_store import SQLiteLogStore
+
+TimeBound = Union[datetime, str, None]
+
+BUCKET_LENGTHS = {"minute": 16, "hour": 13, "day": 10}
+
+
+def _iso(value: TimeBound) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def last(hours: float = 24) -> str:
+    """Начало окна «последние N часов» в формате timestamp логов."""
+    return _iso(datetime.now(timezone.utc) - timedelta(hours=hours))
+
+
+_ANY_TOOL = object()
+
+
+def _where(since: TimeBound, until: TimeBound, tool=_ANY_TOOL,
+           extra: Sequence[str] = ()) -> Tuple[str, list]:
+    clauses, params = list(extra), []
+    if tool is not _ANY_TOOL:
+        # IS сравнивает и NULL: строки без tool_used тоже попадают в свою группу
+        clauses.append("tool_used IS ?")
+        params.append(tool)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(_iso(since))
+    if until is not None:
+        clauses.append("timestamp < ?")
+        params.append(_iso(until))
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def latency_percentiles(store: SQLiteLogStore, since: TimeBound = None, until: TimeBound = None,
+                        percentiles: Sequence[float] = (50, 95, 99)) -> Dict[str, Dict[str, float]]:
+    """
+    Перцентили step_duration_sec по инструментам за окно времени.
+
+    Каждый перцентиль выбирается запросом ORDER BY ... LIMIT 1 OFFSET k по строкам
+    одного инструмента в окне, которые находятся по индексу (tool_used, timestamp).
+    """
+    where, params = _where(since, until)
+    tools = [row[0] for row in store.query(f"SELECT DISTINCT tool_used FROM agent_calls{where}", params)]
+
+    result = {}
+    for tool in tools:
+        where, params = _where(since, until, tool, extra=["step_duration_sec IS NOT NULL"])
+        count = store.query(f"SELECT COUNT(*) FROM agent_calls{where}", params)[0][0]
+        if not count:
+            continue
+        stats = {"count": count}
+        for p in percentiles:
+            offset = min(count - 1, int(count * p / 100))
+            stats[f"p{p:g}"] = store.query(
+                f"SELECT step_duration_sec FROM agent_calls{where} ORDER BY step_duration_sec LIMIT 1 OFFSET ?",
+                params + [offset],
+            )[0][0]
+        result[tool or ""] = stats
+    return result
+
+
+def token_totals(store: SQLiteLogStore, since: TimeBound = None,
+                 until: TimeBound = None) -> Dict[str, Dict[str, int]]:
+    """Число вызовов и сумма входных/выходных токенов по инструментам за окно времени."""
+    where, params = _where(since, until)
+    rows = store.query(
+        "SELECT tool_used, COUNT(*), COALESCE(SUM(input_token_count), 0), COALESCE(SUM(output_token_count), 0) "
+        f"FROM agent_calls{where} GROUP BY tool_used",
+        params,
+    )
+    return {
+        tool or "": {"calls": calls, "input_tokens": input_tokens, "output_tokens": output_tokens}
+        for tool, calls, input_tokens, output_tokens in rows
+    }
+
+
+def error_rates(store: SQLiteLogStore, since: TimeBound = None, until: TimeBound = None,
+                bucket: str = "hour") -> List[Dict[str, Union[str, int, float]]]:
+    """Доля вызовов с непустым error по интервалам времени (minute, hour или day)."""
+    if bucket not in BUCKET_LENGTHS:
+        raise ValueError("Invalid bucket: choose 'minute', 'hour' or 'day'")
+    where, params = _where(since, until)
+    rows = store.query(
+        f"SELECT substr(timestamp, 1, {BUCKET_LENGTHS[bucket]}) AS bucket, COUNT(*), "
+        "SUM(CASE WHEN error IS NOT NULL AND error != '' THEN 1 ELSE 0 END) "
+        f"FROM agent_calls{where} GROUP BY bucket ORDER BY bucket",
+        params,
+    )
+    return [
+        {"bucket": name, "calls": calls, "errors": errors, "error_rate": errors / calls if calls else 0.0}
+        for name, calls, errors in rows
+    ]
@@ -0,0 +1,104 @@
+import csv
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from utils.logger import FIELDNAMES
+
+LOG_DB = "logs/agent_calls.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agent_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    user_input TEXT,
+    tool_used TEXT,
+    step_duration_sec REAL,
+    input_token_count INTEGER,
+    output_token_count INTEGER,
+    final_answer TEXT,
+    agent_thought TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS agent_calls_timestamp ON agent_calls(timestamp);
+CREATE INDEX IF NOT EXISTS agent_calls_tool_timestamp ON agent_calls(tool_used, timestamp);
+"""
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    number = _to_float(value)
+    return int(number) if number is not None else None
+
+
+class SQLiteLogStore:
+    """
+    Хранилище логов вызовов агента в SQLite.
+
+    Колонки повторяют agent_calls.csv; индексы по timestamp и (tool_used, timestamp)
+    позволяют считать аналитику за окно времени без полного просмотра таблицы.
+    """
+
+    def __init__(self, path: str = LOG_DB):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def insert_rows(self, rows: Iterable[Dict]) -> int:
+        """Добавляет строки в формате log_agent_call; возвращает число добавленных строк."""
+        values = [(
+            row["timestamp"],
+            row.get("user_input"),
+            row.get("tool_used"),
+            _to_float(row.get("step_duration_sec")),
+            _to_int(row.get("input_token_count")),
+            _to_int(row.get("output_token_count")),
+            row.get("final_answer"),
+            row.get("agent_thought"),
+            row.get("error"),
+        ) for row in rows]
+        with self._lock:
+            self.conn.executemany(
+                f"INSERT INTO agent_calls ({', '.join(FIELDNAMES)}) VALUES ({', '.join('?' * len(FIELDNAMES))})",
+                values,
+            )
+            self.conn.commit()
+        return len(values)
+
+    def query(self, sql: str, params: Iterable = ()) -> List[tuple]:
+        with self._lock:
+            return self.conn.execute(sql, tuple(params)).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+def import_csv(csv_path: str, store: SQLiteLogStore, batch_size: int = 1000) -> int:
+    """Однократно переносит существующий agent_calls.csv в SQLite; возвращает число строк."""
+    total = 0
+    batch = []
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            if not row.get("timestamp"):
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                total += store.insert_rows(batch)
+                batch = []
+    if batch:
+        total += store.insert_rows(batch)
+    return total
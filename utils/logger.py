@@ -1,27 +1,38 @@
+import atexit
 import csv
+import json
 import os
+import threading
+import time
+from collections import deque
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Union
 
 LOG_FILE = "logs/agent_calls.csv"
+TRACE_FILE = "logs/agent_traces.jsonl"
 
-def init_logging():
+# Число токенов или функция, вычисляющая его при записи
+TokenCount = Union[int, None, Callable[[], int]]
+
+FIELDNAMES = [
+    "timestamp",
+    "user_input",
+    "tool_used",
+    "step_duration_sec",
+    "input_token_count",
+    "output_token_count",
+    "final_answer",
+    "agent_thought",
+    "error"
+]
+
+def init_logging(path: str = LOG_FILE):
     """
     Создаёт файл логов с заголовками, если он ещё не существует.
     """
-    if not os.path.exists(LOG_FILE):
-        with open(LOG_FILE, mode="w", encoding="utf-8-sig", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=[
-                "timestamp",
-                "user_input",
-                "tool_used",
-                "step_duration_sec",
-                "input_token_count",
-                "output_token_count",
-                "final_answer",
-                "agent_thought",
-                "error"
-            ])
+    if not os.path.exists(path):
+        with open(path, mode="w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
             writer.writeheader()
 
 
@@ -31,29 +42,280 @@ def clean(text: Optional[str]) -> str:
     return str(text).replace('\n', ' ').replace('\r', ' ').strip()
 
 
-def log_agent_call(user_input: str, tool_used: Optional[str], duration: Optional[float], input_tokens: int, output_tokens: int, final_answer: str, agent_thought: str = "", error: Optional[str] = ""):
-    timestamp = datetime.now(timezone.utc).isoformat()
-
-    with open(LOG_FILE, mode="a", encoding="utf-8-sig", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=[
-            "timestamp",
-            "user_input",
-            "tool_used",
-            "step_duration_sec",
-            "input_token_count",
-            "output_token_count",
-            "final_answer",
-            "agent_thought",
-            "error"
-        ])
-        writer.writerow({
-            "timestamp": timestamp,
-            "user_input": clean(user_input),
-            "tool_used": clean(tool_used),
-            "step_duration_sec": duration,
-            "input_token_count": input_tokens,
-            "output_token_count": output_tokens,
-            "final_answer": clean(final_answer)[:5000],
-            "agent_thought": clean(agent_thought)[:1000],
-            "error": clean(error or "")[:1000]
-        })
+def _build_row(user_input: str, tool_used: Optional[str], duration: Optional[float], input_tokens: TokenCount, output_tokens: TokenCount, final_answer: str, agent_thought: str = "", error: Optional[str] = "") -> Dict:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "user_input": clean(user_input),
+        "tool_used": clean(tool_used),
+        "step_duration_sec": duration,
+        "input_token_count": input_tokens,
+        "output_token_count": output_tokens,
+        "final_answer": clean(final_answer)[:5000],
+        "agent_thought": clean(agent_thought)[:1000],
+        "error": clean(error or "")[:1000]
+    }
+
+
+def _resolve(row: Dict) -> Dict:
+    """Вычисляет отложенные значения (например, подсчёт токенов), переданные как функции."""
+    return {key: value() if callable(value) else value for key, value in row.items()}
+
+
+# Запись в CSV из нескольких потоков (например, сессий AgentServer) без фоновой записи
+_csv_lock = threading.Lock()
+
+
+def _write_rows(rows: List[Dict], path: str = LOG_FILE):
+    rows = [_resolve(row) for row in rows]
+    with _csv_lock:
+        with open(path, mode="a", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+            writer.writerows(rows)
+
+    store = _log_store
+    if store is not None:
+        store.insert_rows(rows)
+
+
+class _TraceLine:
+    """Строка JSONL-файла трасс в очереди AsyncLogWriter."""
+
+    def __init__(self, line: str, path: str):
+        self.line = line
+        self.path = path
+
+
+class AsyncLogWriter:
+    """
+    Фоновая запись логов пачками.
+
+    log_agent_call и log_trace только кладут запись в ограниченную очередь, а отдельный
+    поток пишет накопленные записи в CSV (и трассы в JSONL) при заполнении пачки
+    (batch_size) или раз в flush_interval секунд. Файлы ротируются по размеру
+    (max_bytes) и/или по дате (rotate_daily). При переполнении очереди действует политика overflow:
+    "drop_newest" — отбросить новую запись, "drop_oldest" — вытеснить самую старую,
+    "block" — ждать освобождения места. Отброшенные записи учитываются в stats["dropped"].
+    Команды flush и close не занимают место в очереди и никогда не вытесняются.
+    """
+
+    _FLUSH = object()
+    _STOP = object()
+
+    def __init__(self, path: str = LOG_FILE, max_queue: int = 10000, batch_size: int = 100,
+                 flush_interval: float = 1.0, overflow: str = "drop_oldest",
+                 max_bytes: Optional[int] = 10 * 1024 * 1024, rotate_daily: bool = False,
+                 backup_count: int = 5):
+        if overflow not in ("drop_newest", "drop_oldest", "block"):
+            raise ValueError("Invalid overflow policy: choose 'drop_newest', 'drop_oldest' or 'block'")
+        self.path = path
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.backup_count = backup_count
+        self.stats = {"written": 0, "dropped": 0, "batches": 0, "rotations": 0, "write_errors": 0}
+        # Записи и команды (_FLUSH/_STOP) в порядке поступления; лимит max_queue — только для записей
+        self._items: deque = deque()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._current_dates: Dict[str, Optional[str]] = {}
+        self._thread = threading.Thread(target=self._run, name="AsyncLogWriter", daemon=True)
+        self._thread.start()
+
+    def put(self, row: Union[Dict, _TraceLine]) -> bool:
+        """Кладёт запись в очередь. Возвращает False, если запись была отброшена."""
+        with self._cond:
+            if self._pending >= self.max_queue:
+                if self.overflow == "block":
+                    self._cond.wait_for(lambda: self._pending < self.max_queue)
+                elif self.overflow == "drop_oldest":
+                    self._drop_oldest()
+                    self.stats["dropped"] += 1
+                else:
+                    self.stats["dropped"] += 1
+                    return False
+            self._items.append(row)
+            self._pending += 1
+            self._cond.notify_all()
+            return True
+
+    def _drop_oldest(self) -> None:
+        """Вытесняет самую старую запись, пропуская команды; вызывается под _cond."""
+        for idx, item in enumerate(self._items):
+            if not isinstance(item, tuple):
+                del self._items[idx]
+                self._pending -= 1
+                return
+
+    def _command(self, command: object, done: Optional[threading.Event] = None) -> None:
+        with self._cond:
+            self._items.append((command, done))
+            self._cond.notify_all()
+
+    def _get(self, timeout: float):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            item = self._items.popleft()
+            if not isinstance(item, tuple):
+                self._pending -= 1
+                self._cond.notify_all()
+            return item
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Дожидается записи всего, что было в очереди на момент вызова."""
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._command(self._FLUSH, done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Записывает остаток очереди и останавливает фоновый поток."""
+        if self._thread.is_alive():
+            self._command(self._STOP)
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        batch: List[Dict] = []
+        traces: List[_TraceLine] = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            item = self._get(max(0.0, deadline - time.monotonic()))
+
+            control = item[0] if isinstance(item, tuple) else None
+            if isinstance(item, dict):
+                batch.append(item)
+            elif isinstance(item, _TraceLine):
+                traces.append(item)
+
+            if (control is not None or len(batch) + len(traces) >= self.batch_size
+                    or time.monotonic() >= deadline):
+                if batch:
+                    self._write_batch(batch)
+                    batch = []
+                if traces:
+                    self._write_traces(traces)
+                    traces = []
+                deadline = time.monotonic() + self.flush_interval
+
+            if control is self._FLUSH:
+                item[1].set()
+            elif control is self._STOP:
+                return
+
+    def _write_batch(self, batch: List[Dict]) -> None:
+        try:
+            self._rotate_if_needed(self.path)
+            init_logging(self.path)
+            _write_rows(batch, self.path)
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+        except Exception as e:
+            self.stats["write_errors"] += 1
+            print(f"[!] Не удалось записать логи: {e}")
+
+    def _write_traces(self, traces: List[_TraceLine]) -> None:
+        by_path: Dict[str, List[str]] = {}
+        for trace in traces:
+            by_path.setdefault(trace.path, []).append(trace.line)
+        for path, lines in by_path.items():
+            try:
+                self._rotate_if_needed(path)
+                with open(path, mode="a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                self.stats["written"] += len(lines)
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                print(f"[!] Не удалось записать трассы: {e}")
+
+    @staticmethod
+    def _file_date(path: str) -> Optional[str]:
+        if not os.path.exists(path):
+            return None
+        return datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d")
+
+    def _rotate_if_needed(self, path: str) -> None:
+        if path not in self._current_dates:
+            self._current_dates[path] = self._file_date(path)
+        if not os.path.exists(path):
+            return
+
+        today = datetime.now().strftime("%Y-%m-%d")
+        current_date = self._current_dates[path]
+        base, ext = os.path.splitext(path)
+        if self.rotate_daily and current_date and current_date != today:
+            os.replace(path, f"{base}.{current_date}{ext}")
+            self.stats["rotations"] += 1
+        elif self.max_bytes and os.path.getsize(path) >= self.max_bytes:
+            for idx in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f"{base}.{idx}{ext}"):
+                    os.replace(f"{base}.{idx}{ext}", f"{base}.{idx + 1}{ext}")
+            os.replace(path, f"{base}.1{ext}")
+            self.stats["rotations"] += 1
+        self._current_dates[path] = today
+
+
+_async_writer: Optional[AsyncLogWriter] = None
+_log_store = None
+
+
+def set_log_store(store):
+    """
+    Подключает дополнительное хранилище логов (например, utils.log_store.SQLiteLogStore).
+    Записи продолжают писаться и в CSV. None отключает хранилище.
+    """
+    global _log_store
+    _log_store = store
+
+
+def enable_async_logging(**kwargs) -> AsyncLogWriter:
+    """
+    Включает фоновую запись логов; параметры передаются в AsyncLogWriter.
+    Остаток очереди записывается при завершении процесса.
+    """
+    global _async_writer
+    disable_async_logging()
+    _async_writer = AsyncLogWriter(**kwargs)
+    atexit.register(_async_writer.close)
+    return _async_writer
+
+
+def disable_async_logging():
+    """Записывает накопленные логи и возвращает синхронный режим."""
+    global _async_writer
+    writer, _async_writer = _async_writer, None
+    if writer is not None:
+        writer.close()
+        atexit.unregister(writer.close)
+
+
+def log_agent_call(user_input: str, tool_used: Optional[str], duration: Optional[float], input_tokens: TokenCount, output_tokens: TokenCount, final_answer: str, agent_thought: str = "", error: Optional[str] = ""):
+    row = _build_row(user_input, tool_used, duration, input_tokens, output_tokens, final_answer, agent_thought, error)
+
+    writer = _async_writer
+    if writer is not None:
+        writer.put(row)
+    else:
+        _write_rows([row])
+
+
+_trace_lock = threading.Lock()
+
+
+def log_trace(trace: Dict, path: str = TRACE_FILE):
+    """
+    Дописывает дерево спанов одного запуска агента в JSONL-файл трасс.
+    При включённой фоновой записи трасса уходит в очередь AsyncLogWriter.
+    """
+    line = json.dumps(trace, ensure_ascii=False, default=str)
+    writer = _async_writer
+    if writer is not None:
+        writer.put(_TraceLine(line, path))
+        return
+    with _trace_lock:
+        with open(path, mode="a", encoding="utf-8") as f:
+            f.write(line + "\n")